@@ -0,0 +1,18 @@
+"""Local grit-cloud simulator and benchmarks for the WeBack cloud client."""
+
+import importlib
+import pathlib
+import sys
+import types
+
+COMPONENT = pathlib.Path(__file__).resolve().parent.parent / "custom_components" / "weback_robot_vacuum"
+PACKAGE = "weback_robot_vacuum"
+
+
+def component_module(name):
+    """Import one of the component's cloud modules without running the Home Assistant setup in __init__."""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(COMPONENT)]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(PACKAGE + "." + name)
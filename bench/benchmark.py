@@ -0,0 +1,211 @@
+"""End-to-end benchmark of the cloud client against the local grit-cloud simulator.
+
+    python -m bench.benchmark --robots 1 10 100 --duration 10
+
+For every robot count a fresh simulator is started in its own process, so thread, socket and
+memory figures belong to the client alone. Reported per run:
+
+  login/list/connect  time to log in, fetch the robot list and open the socket
+  push p50/p95        simulator send to RobotController state write (update callback)
+  cmd p50/p95         shadow update sent to the status push confirming it
+  msgs/s              status frames applied by the client per second
+  threads, sockets    live threads and open socket descriptors of this process
+  rss                 resident memory of this process
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+import aiohttp
+import httpx
+
+from . import component_module
+
+TrafficRecorder = component_module("TrafficRecorder").TrafficRecorder
+WebackVacuumApi = component_module("WebackVacuumApi").WebackVacuumApi
+RobotController = component_module("RobotController").RobotController
+FramesDropped = component_module("OutboundBuffer").FramesDropped
+
+COLUMNS = ("robots", "login ms", "list ms", "connect ms", "push p50", "push p95", "cmd p50", "cmd p95",
+           "msgs/s", "threads", "sockets", "rss MB")
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def open_sockets() -> int:
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return -1
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink("/proc/self/fd/" + fd).startswith("socket:"):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Peak rather than current outside Linux
+        scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+async def start_simulator(args, robots):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "bench.grit_cloud",
+        "--robots", str(robots),
+        "--push-rate", str(args.push_rate),
+        "--latency", str(args.latency),
+        "--drop-rate", str(args.drop_rate),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    line = (await process.stdout.readline()).decode().strip()
+    if not line.startswith("listening on "):
+        process.kill()
+        raise RuntimeError("simulator did not start: " + line)
+    return process, line[len("listening on "):]
+
+
+class Recorder:
+    """Update callbacks standing in for the entity state writes."""
+
+    def __init__(self):
+        self.applied = 0
+        self.push_latencies = []
+
+    def callback(self, controller):
+        def status_written(changed):
+            self.applied += 1
+            if "sim_sent_at" in changed:
+                self.push_latencies.append(time.monotonic() - controller.status["sim_sent_at"])
+        return status_written
+
+
+async def send_commands(controller, args, latencies):
+    modes = (RobotController.CLEAN_MODE_AUTO, RobotController.CLEAN_MODE_STOP)
+    for n in range(args.commands):
+        try:
+            latencies.append(await controller.send_state({"working_status": modes[n % 2]}, wait=True,
+                                                         timeout=args.command_timeout))
+        except (asyncio.TimeoutError, FramesDropped):
+            # Dropped by the simulator or the client, counted as missing from the percentiles
+            pass
+
+
+async def run(args, robots) -> dict:
+    process, base_url = await start_simulator(args, robots)
+    session = aiohttp.ClientSession()
+    traffic = TrafficRecorder(os.path.join(args.record, "bench-%d.jsonl" % robots)) if args.record else None
+    api = WebackVacuumApi("bench@example.com", "bench", "54", session, http_client=httpx.AsyncClient(),
+                          auth_url=base_url + "/oauth", recorder=traffic)
+    recorder = Recorder()
+    command_latencies = []
+
+    try:
+        started = time.monotonic()
+        if not await api.tokens.valid_token():
+            raise RuntimeError("login against the simulator failed")
+        logged_in = time.monotonic()
+        thing_list = await api.robot_list()
+        listed = time.monotonic()
+        if not await api.connect_wss():
+            raise RuntimeError("socket connect against the simulator failed")
+        connected = time.monotonic()
+
+        controllers = []
+        for robot in thing_list:
+            controller = RobotController(robot["thing_name"], robot["thing_nickname"], robot["sub_type"],
+                                         robot["thing_status"], api)
+            controller.register_update_callback(recorder.callback(controller))
+            controllers.append(controller)
+
+        await asyncio.sleep(args.duration)
+        applied = recorder.applied
+        threads = threading.active_count()
+        sockets = open_sockets()
+        rss = rss_mb()
+
+        await asyncio.gather(*(send_commands(controller, args, command_latencies) for controller in controllers))
+        if args.metrics:
+            print(json.dumps(api.metrics.as_dict(), indent=2))
+    finally:
+        await api.close()
+        if traffic is not None:
+            # Already flushed by api.close, a second close only makes sure the trace is complete
+            await traffic.close()
+        await session.close()
+        process.terminate()
+        await process.wait()
+
+    return {
+        "robots": robots,
+        "login ms": (logged_in - started) * 1000,
+        "list ms": (listed - logged_in) * 1000,
+        "connect ms": (connected - listed) * 1000,
+        "push p50": percentile(recorder.push_latencies, 0.5) * 1000,
+        "push p95": percentile(recorder.push_latencies, 0.95) * 1000,
+        "cmd p50": percentile(command_latencies, 0.5) * 1000,
+        "cmd p95": percentile(command_latencies, 0.95) * 1000,
+        "msgs/s": applied / args.duration,
+        "threads": threads,
+        "sockets": sockets,
+        "rss MB": rss,
+    }
+
+
+def print_table(rows):
+    widths = [max(len(column), 10) for column in COLUMNS]
+    print("  ".join(column.rjust(width) for column, width in zip(COLUMNS, widths)))
+    for row in rows:
+        cells = []
+        for column, width in zip(COLUMNS, widths):
+            value = row[column]
+            cells.append((str(value) if isinstance(value, int) else "%.1f" % value).rjust(width))
+        print("  ".join(cells))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--robots", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of pushes measured per run")
+    parser.add_argument("--push-rate", type=float, default=1.0, help="pushes per robot per second")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated cloud latency in seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability the simulator drops a frame")
+    parser.add_argument("--commands", type=int, default=5, help="commands sent to every robot")
+    parser.add_argument("--command-timeout", type=float, default=5.0)
+    parser.add_argument("--metrics", action="store_true", help="print the client's ConnectionMetrics after every run")
+    parser.add_argument("--record", metavar="DIR", help="write a traffic trace of every run, see bench.replay")
+    return parser.parse_args(argv)
+
+
+async def benchmark(args):
+    rows = []
+    for robots in args.robots:
+        rows.append(await run(args, robots))
+    print_table(rows)
+
+
+def main(argv=None):
+    asyncio.run(benchmark(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Stand-in for the grit-cloud backend: OAuth login, robot list and the status socket.
+
+Run it alone with `python -m bench.grit_cloud --robots 10` and point the component at it, or let
+bench.benchmark start it. Every robot pushes thing_status_update at --push-rate per second, and
+shadow updates sent by the client are applied and answered with the new status. Outbound frames
+are delayed by --latency seconds and dropped with probability --drop-rate.
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import time
+
+from aiohttp import WSMsgType, web
+
+REGION_NAME = "sim-region-1"
+TOKEN_LIFETIME = 24 * 3600
+
+
+def make_token(serial) -> str:
+    """Return an unsigned JWT whose exp claim the client can read."""
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+    return ".".join([
+        encode({"alg": "none", "typ": "JWT"}),
+        encode({"sub": serial, "exp": int(time.time()) + TOKEN_LIFETIME}),
+        "sim",
+    ])
+
+
+def robot_status(index) -> dict:
+    return {
+        "connected": "true",
+        "working_status": "Charging",
+        "battery_level": str(50 + index % 50),
+        "fan_status": "Normal",
+        "error_info": "NoError",
+    }
+
+
+class GritCloudSimulator:
+    """Serves N simulated robots to any number of client sockets."""
+
+    def __init__(self, robots=1, push_rate=1.0, latency=0.0, drop_rate=0.0, seed=None):
+        self.push_rate = push_rate
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.things = {
+            "sim-robot-%04d" % index: robot_status(index) for index in range(robots)
+        }
+        self.tokens = set()
+        self.serials = itertools.count(1)
+        self.sockets = set()
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.base_url = None
+        self.runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/oauth", self.oauth)
+        self.app.router.add_post("/api", self.api)
+        self.app.router.add_get("/ws", self.websocket)
+
+    async def start(self, host="127.0.0.1", port=0) -> str:
+        """Start serving, returns the base URL. Port 0 picks a free one."""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = "http://%s:%s" % (host, port)
+        return self.base_url
+
+    async def stop(self):
+        for ws in list(self.sockets):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def oauth(self, request):
+        data = await request.json()
+        if data.get("payload", {}).get("opt") != "login" or not data.get("header", {}).get("account"):
+            return web.json_response({"msg": "fail"})
+
+        token = make_token(next(self.serials))
+        self.tokens.add(token)
+        return web.json_response({
+            "msg": "success",
+            "data": {
+                "jwt_token": token,
+                "region_name": REGION_NAME,
+                "wss_url": self.base_url.replace("http", "ws", 1) + "/ws",
+                "api_url": self.base_url + "/api",
+            },
+        })
+
+    async def api(self, request):
+        if request.headers.get("Token") not in self.tokens:
+            return web.Response(status=401)
+
+        data = await request.json()
+        if data.get("opt") != "user_thing_list_get":
+            return web.json_response({"msg": "fail"})
+
+        return web.json_response({
+            "msg": "success",
+            "data": {
+                "thing_list": [
+                    {
+                        "thing_name": thing_name,
+                        "thing_nickname": "Robot " + thing_name[-4:],
+                        "sub_type": "sim-vacuum",
+                        "thing_status": dict(status),
+                    }
+                    for thing_name, status in self.things.items()
+                ],
+            },
+        })
+
+    async def websocket(self, request):
+        if request.headers.get("token") not in self.tokens:
+            return web.Response(status=401)
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        pusher = asyncio.create_task(self.push(ws)) if self.push_rate > 0 and self.things else None
+
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    self.frames_received += 1
+                    self.handle(ws, msg.data)
+        finally:
+            if pusher is not None:
+                pusher.cancel()
+            self.sockets.discard(ws)
+        return ws
+
+    def handle(self, ws, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+
+        status = self.things.get(message.get("thing_name"))
+        if status is None:
+            return
+
+        opt = message.get("opt")
+        if opt == "thing_status_get":
+            self.send_status(ws, message["thing_name"])
+        elif opt == "send_to_device":
+            status.update(message.get("topic_payload", {}).get("state", {}))
+            self.send_status(ws, message["thing_name"])
+
+    async def push(self, ws):
+        """Spread pushes for all robots evenly, push_rate per robot per second."""
+        interval = 1.0 / (self.push_rate * len(self.things))
+        next_at = time.monotonic()
+
+        for thing_name in itertools.cycle(list(self.things)):
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            status = self.things[thing_name]
+            status["battery_level"] = str((int(status["battery_level"]) + 1) % 101)
+            self.send_status(ws, thing_name)
+
+    def send_status(self, ws, thing_name):
+        # sim_sent_at lets a client on the same host measure push latency, it uses time.monotonic
+        self.send(ws, {
+            "notify_info": "thing_status_update",
+            "thing_name": thing_name,
+            "thing_status": dict(self.things[thing_name], sim_sent_at=time.monotonic()),
+        })
+
+    def send(self, ws, message):
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            self.frames_dropped += 1
+            return
+
+        frame = json.dumps(message)
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self.write, ws, frame)
+        else:
+            self.write(ws, frame)
+
+    def write(self, ws, frame):
+        if ws.closed:
+            return
+        self.frames_sent += 1
+        asyncio.create_task(ws.send_str(frame))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--robots", type=int, default=1)
+    parser.add_argument("--push-rate", type=float, default=1.0, help="pushes per robot per second")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every outbound frame")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability of dropping an outbound frame")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+async def serve(args):
+    simulator = GritCloudSimulator(args.robots, args.push_rate, args.latency, args.drop_rate, args.seed)
+    base_url = await simulator.start(args.host, args.port)
+    # bench.benchmark reads this line to find the port
+    print("listening on " + base_url, flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
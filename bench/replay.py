@@ -0,0 +1,85 @@
+"""Replay a recorded traffic trace through the cloud client, optionally under cProfile.
+
+    python -m bench.replay weback_traffic/me@example.com_54.jsonl --speed 0 --profile
+
+Inbound frames are fed to WebackVacuumApi.handle_frame, reaching one RobotController per robot
+seen in the trace, exactly as live pushes would. --speed 1 keeps the recorded timing, 0 replays
+as fast as possible.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import pstats
+import time
+
+from . import component_module
+
+MessageCodec = component_module("MessageCodec")
+TrafficRecorder = component_module("TrafficRecorder")
+WebackVacuumApi = component_module("WebackVacuumApi").WebackVacuumApi
+RobotController = component_module("RobotController").RobotController
+
+
+def thing_names(path) -> set:
+    names = set()
+    for recorded_at, direction, frame in TrafficRecorder.read_trace(path):
+        if direction != TrafficRecorder.TRAFFIC_IN:
+            continue
+        try:
+            names.add(MessageCodec.loads(frame).get("thing_name"))
+        except (ValueError, AttributeError):
+            pass
+    names.discard(None)
+    return names
+
+
+async def run(args):
+    api = WebackVacuumApi("replay", "replay", "0", None)
+    writes = 0
+
+    def state_written(changed):
+        nonlocal writes
+        writes += 1
+
+    for name in thing_names(args.trace):
+        controller = RobotController(name, name, "", {}, api)
+        controller.register_update_callback(state_written)
+
+    started = time.monotonic()
+    frames = await TrafficRecorder.replay(args.trace, api, args.speed)
+    elapsed = time.monotonic() - started
+
+    print("frames       %d" % frames)
+    print("elapsed      %.3f s" % elapsed)
+    print("frames/s     %.0f" % (frames / elapsed if elapsed else float("inf")))
+    print("state writes %d" % writes)
+    print("dropped      %d" % api.dropped_frames)
+    for notify_info, count in api.unknown_notify_counts.most_common():
+        print("unknown      %s: %d" % (notify_info, count))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 is real time, 0 as fast as possible")
+    parser.add_argument("--profile", action="store_true", help="print the hottest functions")
+    parser.add_argument("--top", type=int, default=25, help="functions listed with --profile")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.profile:
+        asyncio.run(run(args))
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    asyncio.run(run(args))
+    profiler.disable()
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Quiet time required after the last write before a burst is sent
+DEBOUNCE_WINDOW = 0.3
+# A write that keeps being replaced is still sent after this long
+DEBOUNCE_MAX = 2.0
+# Minimum seconds between two messages to the same robot
+MIN_SEND_INTERVAL = 1.0
+
+
+class CommandQueue:
+    """Outbound shadow writes of one robot, coalesced per key, debounced and rate limited.
+
+    Everything pending when the queue flushes goes out as a single multi-key shadow update,
+    followed by a sync_thing when any of the writes asked for one. Every shadow write goes
+    through here. Status requests do not, as they are not writes: update() joins the one in
+    flight, and the outbound buffer sends them after any command.
+    """
+
+    def __init__(self, send, debounce=DEBOUNCE_WINDOW, debounce_max=DEBOUNCE_MAX, min_interval=MIN_SEND_INTERVAL):
+        self.send = send
+        self.debounce = debounce
+        self.debounce_max = debounce_max
+        self.min_interval = min_interval
+        self.pending = {}
+        self.sync = False
+        self.wakeup = asyncio.Event()
+        self.sender = None
+        self.last_sent_at = 0.0
+
+    def put_state(self, state: dict, sync=False):
+        """Queue several writes at once, each replacing any pending value for its key."""
+        self.sync = self.sync or sync
+        for key, value in state.items():
+            self.pending.pop(key, None)
+            self.pending[key] = value
+        self.wakeup.set()
+
+        if self.sender is None or self.sender.done():
+            self.sender = asyncio.create_task(self.run())
+
+    def cancel(self):
+        self.pending.clear()
+        self.sync = False
+        if self.sender is not None:
+            self.sender.cancel()
+
+    async def run(self):
+        while self.pending:
+            await self.wait_for_quiet()
+
+            wait = self.last_sent_at + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            state, sync = self.pending, self.sync
+            self.pending, self.sync = {}, False
+            self.last_sent_at = time.monotonic()
+
+            try:
+                await self.send(state, sync)
+            except Exception:
+                _LOGGER.exception("CommandQueue failed to send %s", state)
+
+    async def wait_for_quiet(self):
+        deadline = time.monotonic() + self.debounce_max
+
+        while True:
+            self.wakeup.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), min(self.debounce, remaining))
+            except asyncio.TimeoutError:
+                return
@@ -0,0 +1,91 @@
+import bisect
+import time
+from collections import Counter, defaultdict, deque
+
+# Upper bounds in seconds of the latency buckets, anything slower lands in a last open bucket
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECONNECT_WINDOW = 3600
+
+
+class LatencyHistogram:
+    """Sample counts per latency bucket, with the total and maximum."""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self) -> dict:
+        labels = [str(bound) for bound in LATENCY_BUCKETS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "max_ms": round(self.max * 1000, 3),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class ConnectionMetrics:
+    """Counters and latency histograms of one account's cloud traffic.
+
+    Operations are login, robot_list, connect, send and receive; each one counts calls and
+    failures and times every call. Cheap enough to stay on for every frame.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.latencies = defaultdict(LatencyHistogram)
+        self.connected_since = None
+        self.last_receive_at = None
+        self.connect_count = 0
+        self.reconnects = deque()
+
+    def observe(self, operation, started, ok=True):
+        """Record one call of operation that began at time.perf_counter() value started."""
+        self.latencies[operation].observe(time.perf_counter() - started)
+        self.counters[operation] += 1
+        if not ok:
+            self.counters[operation + "_failed"] += 1
+
+    def received(self, frame, started):
+        """Record an inbound frame handled since started."""
+        self.latencies["receive"].observe(time.perf_counter() - started)
+        self.counters["receive"] += 1
+        self.counters["receive_bytes"] += len(frame)
+        self.last_receive_at = time.time()
+
+    def connected(self):
+        if self.connect_count:
+            self.reconnects.append(time.monotonic())
+        self.connect_count += 1
+        self.connected_since = time.time()
+
+    def disconnected(self):
+        self.connected_since = None
+
+    @property
+    def reconnects_last_hour(self) -> int:
+        horizon = time.monotonic() - RECONNECT_WINDOW
+        while self.reconnects and self.reconnects[0] < horizon:
+            self.reconnects.popleft()
+        return len(self.reconnects)
+
+    def as_dict(self) -> dict:
+        now = time.time()
+        return {
+            "counters": dict(self.counters),
+            "latencies": {operation: histogram.as_dict() for operation, histogram in self.latencies.items()},
+            "connected_for_s": round(now - self.connected_since) if self.connected_since else None,
+            "last_receive_age_s": round(now - self.last_receive_at, 1) if self.last_receive_at else None,
+            "reconnects_last_hour": self.reconnects_last_hour,
+        }
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import random
+
+_LOGGER = logging.getLogger(__name__)
+
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 300.0
+
+
+def reconnect_backoff(failures) -> float:
+    """Full jitter: a random delay up to the exponential bound, so reconnects do not stampede."""
+    bound = min(RECONNECT_MAX, RECONNECT_MIN * 2 ** min(failures, 16))
+    return random.uniform(RECONNECT_MIN, max(bound, RECONNECT_MIN))
+
+
+class ConnectionSupervisor:
+    """Keeps the account socket connected, reconnecting with jittered exponential backoff.
+
+    Heartbeats and half-open detection are done by the socket itself: it pings every
+    heartbeat interval and drops the connection when a pong does not come back in time.
+    """
+
+    def __init__(self, weback_api, on_connected):
+        self.weback_api = weback_api
+        self.on_connected = on_connected
+        self.task = None
+        self.consecutive_failures = 0
+        self.listeners = []
+
+    def start(self):
+        # Reconnects follow the backoff here, the outbound writer just waits for them
+        self.weback_api.connect_on_send = False
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.weback_api.connect_on_send = True
+
+    def add_listener(self, listener):
+        """Call listener() on every connectivity change, returns a function removing it."""
+        self.listeners.append(listener)
+        return lambda: self.listeners.remove(listener)
+
+    def notify(self):
+        for listener in list(self.listeners):
+            listener()
+
+    async def run(self):
+        while True:
+            if await self.weback_api.connect_wss():
+                self.consecutive_failures = 0
+                self.notify()
+
+                try:
+                    await self.on_connected()
+                except Exception:
+                    _LOGGER.exception("ConnectionSupervisor failed to re-subscribe robots")
+
+                await self.weback_api.wait_closed()
+                _LOGGER.debug("ConnectionSupervisor: socket closed, reconnecting")
+            else:
+                self.consecutive_failures += 1
+                _LOGGER.debug("ConnectionSupervisor: connect failed %s times in a row", self.consecutive_failures)
+
+            self.notify()
+            await asyncio.sleep(self.backoff())
+
+    def backoff(self) -> float:
+        return reconnect_backoff(self.consecutive_failures)
@@ -0,0 +1,55 @@
+import logging
+import time
+from collections import Counter, OrderedDict
+
+# Seconds between two records with the same key
+SAMPLE_INTERVAL = 60.0
+# Keys remembered, the least recently logged is forgotten first
+MAX_KEYS = 256
+
+
+class LogSampler:
+    """Rate limited logging for messages that can fire on every frame.
+
+    The first record for a key is logged, later ones at most once per interval, each
+    carrying how many were suppressed since. Costs one level check when the level is off.
+    At most max_keys keys are tracked, a forgotten key logs its next record right away.
+    """
+
+    def __init__(self, logger: logging.Logger, interval=SAMPLE_INTERVAL, max_keys=MAX_KEYS):
+        self.logger = logger
+        self.interval = interval
+        self.max_keys = max_keys
+        self.logged_at = OrderedDict()
+        self.suppressed = Counter()
+
+    def log(self, level, msg, *args, key=None):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        key = msg if key is None else key
+        now = time.monotonic()
+        last = self.logged_at.get(key)
+        if last is not None and now - last < self.interval:
+            self.suppressed[key] += 1
+            return
+
+        self.logged_at[key] = now
+        self.logged_at.move_to_end(key)
+        while len(self.logged_at) > self.max_keys:
+            forgotten, _ = self.logged_at.popitem(last=False)
+            self.suppressed.pop(forgotten, None)
+        suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            msg += " (%s similar messages suppressed)"
+            args += (suppressed,)
+        self.logger.log(level, msg, *args)
+
+    def debug(self, msg, *args, key=None):
+        self.log(logging.DEBUG, msg, *args, key=key)
+
+    def warning(self, msg, *args, key=None):
+        self.log(logging.WARNING, msg, *args, key=key)
+
+    def error(self, msg, *args, key=None):
+        self.log(logging.ERROR, msg, *args, key=key)
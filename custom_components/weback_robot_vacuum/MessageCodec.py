@@ -0,0 +1,58 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+    loads = json.loads
+
+
+def parse_coordinates(value, count) -> list:
+    """Return value as a list of count finite numbers, accepting a JSON string such as "[x,y]"."""
+    if isinstance(value, str):
+        try:
+            value = loads(value)
+        except ValueError as e:
+            raise ValueError("Invalid coordinates: " + value) from e
+
+    if not isinstance(value, (list, tuple)) or len(value) != count:
+        raise ValueError(f"Expected {count} coordinates, got {value!r}")
+
+    for coordinate in value:
+        if isinstance(coordinate, bool) or not isinstance(coordinate, (int, float)) or not math.isfinite(coordinate):
+            raise ValueError(f"Invalid coordinate {coordinate!r} in {value!r}")
+
+    return list(value)
+
+
+class RobotMessages:
+    """Prebuilt messages of one robot, only the shadow state is encoded per send."""
+
+    __slots__ = ("thing_name", "sub_type", "status_get", "sync", "shadow_prefix")
+
+    def __init__(self, thing_name, sub_type):
+        self.thing_name = thing_name
+        self.sub_type = sub_type
+
+        self.status_get = dumps({"opt": "thing_status_get", "sub_type": sub_type, "thing_name": thing_name})
+        self.sync = dumps({"opt": "sync_thing", "sub_type": sub_type, "thing_name": thing_name})
+
+        shadow = dumps({
+            "topic_name": "$aws/things/" + thing_name + "/shadow/update",
+            "opt": "send_to_device",
+            "sub_type": sub_type,
+            "thing_name": thing_name,
+        })
+        self.shadow_prefix = shadow[:-1] + ',"topic_payload":{"state":'
+
+    def shadow_update(self, state: dict) -> str:
+        return self.shadow_prefix + dumps(state) + "}}"
@@ -0,0 +1,127 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from .ConnectionMetrics import ConnectionMetrics
+from .LogSampler import LogSampler
+
+_LOGGER = logging.getLogger(__name__)
+_SAMPLED = LogSampler(_LOGGER)
+
+# Lower goes first: commands the user is waiting on before status polls
+PRIORITY_COMMAND = 0
+PRIORITY_STATUS = 1
+
+# Seconds a queued frame stays worth sending, commands match RobotController.ACK_TIMEOUT
+COMMAND_TTL = 30.0
+STATUS_TTL = 10.0
+
+OUTBOUND_LIMIT = 256
+
+
+class FramesDropped(Exception):
+    """Frames that never reached the socket: refused or evicted by a full buffer, or expired."""
+
+
+class OutboundEntry:
+    """Frames queued together and sent back to back.
+
+    on_sent() runs once they are written, on_dropped(error) when they never will be.
+    """
+
+    __slots__ = ("priority", "seq", "expires_at", "frames", "on_sent", "on_dropped")
+
+    def __init__(self, priority, seq, expires_at, frames, on_sent=None, on_dropped=None):
+        self.priority = priority
+        self.seq = seq
+        self.expires_at = expires_at
+        self.frames = frames
+        self.on_sent = on_sent
+        self.on_dropped = on_dropped
+
+    def dropped(self, reason):
+        if self.on_dropped is not None:
+            self.on_dropped(FramesDropped(reason))
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundBuffer:
+    """Bounded queue of outbound frames, by priority then age.
+
+    When full, the oldest entry of the lowest priority makes room, or the new entry is refused
+    when everything queued matters more. Entries past their expiry are dropped, never sent.
+    """
+
+    def __init__(self, metrics: ConnectionMetrics, limit=OUTBOUND_LIMIT):
+        self.metrics = metrics
+        self.limit = limit
+        self.heap = []
+        self.seq = itertools.count()
+        self.nonempty = asyncio.Event()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def put(self, frames, priority=PRIORITY_COMMAND, ttl=COMMAND_TTL, on_sent=None, on_dropped=None) -> bool:
+        """Queue frames, returns False when the buffer is full of more important ones."""
+        entry = OutboundEntry(priority, next(self.seq), time.monotonic() + ttl, frames, on_sent, on_dropped)
+        if len(self.heap) >= self.limit:
+            victim = max(self.heap, key=lambda entry: (entry.priority, -entry.seq))
+            self.metrics.counters["outbound_overflow"] += 1
+            if victim.priority < priority:
+                _SAMPLED.warning("Weback outbound buffer full, refusing frames")
+                entry.dropped("Outbound buffer full")
+                return False
+            self.heap.remove(victim)
+            heapq.heapify(self.heap)
+            _SAMPLED.warning("Weback outbound buffer full, dropping the oldest frames")
+            victim.dropped("Evicted from a full outbound buffer")
+
+        heapq.heappush(self.heap, entry)
+        self.nonempty.set()
+        return True
+
+    def requeue(self, entry: OutboundEntry):
+        """Put back an entry whose send failed, keeping its place and expiry."""
+        heapq.heappush(self.heap, entry)
+        self.nonempty.set()
+
+    def pop(self):
+        """Return the next entry still worth sending, None when there is none."""
+        now = time.monotonic()
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry.expires_at >= now:
+                return entry
+            self.stale(entry)
+        return None
+
+    def expire(self):
+        """Drop every expired entry, run while waiting for the socket."""
+        now = time.monotonic()
+        fresh = [entry for entry in self.heap if entry.expires_at >= now]
+        if len(fresh) == len(self.heap):
+            return
+        for entry in self.heap:
+            if entry.expires_at < now:
+                self.stale(entry)
+        self.heap = fresh
+        heapq.heapify(self.heap)
+
+    def stale(self, entry: OutboundEntry):
+        self.metrics.counters["outbound_expired"] += 1
+        _SAMPLED.warning("Weback dropped outbound frames that expired before the socket could take them")
+        entry.dropped("Expired before the socket could take it")
+
+    async def wait(self):
+        """Wait until at least one entry is queued."""
+        while not self.heap:
+            self.nonempty.clear()
+            await self.nonempty.wait()
+
+    def clear(self):
+        self.heap.clear()
@@ -1,10 +1,35 @@
 import asyncio
 import time
-import json
 import logging
+import statistics
+from collections import deque
+from functools import partial
+
+from .CommandQueue import CommandQueue
+from .MessageCodec import RobotMessages, parse_coordinates
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds a command may take before its acknowledgement fails
+ACK_TIMEOUT = 30.0
+# Seconds update() waits for the status push answering its request
+STATUS_TIMEOUT = 10.0
+# Status younger than this is returned by update() without asking the cloud
+STATUS_TTL = 5.0
+LATENCY_SAMPLES = 50
+
+
+class CommandAck:
+    """A command waiting for a status update that shows it applied."""
+    
+    __slots__ = ("expected", "future", "sent_at", "timer")
+    
+    def __init__(self, expected: dict, future: asyncio.Future):
+        self.expected = expected
+        self.future = future
+        self.sent_at = None
+        self.timer = None
+
 
 class RobotController:
     CLEAN_MODE_AUTO = 'AutoClean'
@@ -54,74 +79,76 @@ class RobotController:
     CHARGING_STATES = {CHARGE_MODE_CHARGING, CHARGE_MODE_DOCK_CHARGING, CHARGE_MODE_DIRECT_CHARGING}
     DOCKED_STATES = {CHARGE_MODE_IDLE, CHARGE_MODE_CHARGING, CHARGE_MODE_DOCK_CHARGING, CHARGE_MODE_DIRECT_CHARGING}
     
+    # Status fields that show up in Home Assistant state or attributes
+    STATE_FIELDS = frozenset({'working_status', 'battery_level', 'fan_status', 'error_info', 'connected'})
+    
+    # Seconds without any status before a poll is sent, by what the robot is doing
+    POLL_INTERVAL_CLEANING = 30
+    POLL_INTERVAL_DOCKED = 900
+    POLL_INTERVAL_DEFAULT = 120
+    
     def __init__(self, thing_name, thing_nickname, sub_type, thing_status, weback_api):
         self.name = thing_name
         self.nickname = thing_nickname
         self.sub_type = sub_type
         self.weback_api = weback_api
         self.status = thing_status
+        self.messages = RobotMessages(thing_name, sub_type)
+        self.update_callback = None
+        self.last_status_at = 0.0
+        self.last_poll_at = 0.0
+        self.status_request = None
+        self.commands = CommandQueue(self.send_command)
+        self.acks = []
+        # Acks of send_message writes still waiting in the command queue
+        self.queued_acks = []
+        self.command_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.last_command_latency = None
+        self.median_command_latency = None
     
     async def update(self):
+        """Request the robot status and wait for the push answering it.
+        
+        Concurrent callers join the request in flight, and a status received within STATUS_TTL is reused.
+        """
         _LOGGER.debug("RobotController.update")
-        await self.weback_api.update_status(self.name, self.sub_type)
-    
-    @property
-    def current_mode(self) -> str:
-        try:
-            _LOGGER.debug("RobotController.current_mode: " + self.status['working_status'])
-        except KeyError:
-            _LOGGER.debug(
-                "RobotController.current_mode - working status didnt exist -> setting to idle until I receive an update")
-            self.status['working_status'] = self.CHARGE_MODE_IDLE
-            self.status['battery_level'] = 100
-            self.status['fan_status'] = self.FAN_SPEED_NORMAL
+        if time.monotonic() - self.last_status_at < STATUS_TTL:
+            return
         
-        return self.status['working_status']
-    
-    @property
-    def raw_status(self) -> str:
-        _LOGGER.debug("RobotController.raw_status ", self.status)
-        return self.status
-    
-    @property
-    def is_cleaning(self) -> bool:
-        _LOGGER.debug("RobotController.is_cleaning", self.current_mode)
-        return self.current_mode in self.CLEANING_STATES
-    
-    @property
-    def is_available(self):
-        _LOGGER.debug("Connected: " + self.status['connected'])
-        _LOGGER.debug("RobotController.is_available: ", self.status['connected'] == 'true')
-        return self.status['connected'] == 'true'
-    
-    @property
-    def is_charging(self):
-        return self.current_mode in self.CHARGING_STATES
-    
-    @property
-    def fan_status(self):
-        return self.status["fan_status"]
-    
-    @property
-    def error_info(self):
-        return self.status["error_info"]
-    
-    @property
-    def battery_level(self):
-        return int(self.status["battery_level"])
-    
-    @property
-    def fan_speed_list(self):
-        return [self.FAN_SPEED_QUIET, self.FAN_SPEED_NORMAL, self.FAN_SPEED_HIGH]
+        request = self.status_request
+        if request is None:
+            request = self.status_request = asyncio.get_running_loop().create_future()
+            self.last_poll_at = time.monotonic()
+            try:
+                await self.weback_api.update_status(self.messages)
+            except BaseException:
+                self.status_request = None
+                raise
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(request), STATUS_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.debug("RobotController.update - no status from %s within %s s", self.name, STATUS_TIMEOUT)
+            if self.status_request is request:
+                self.status_request = None
     
     @property
-    def is_on(self):
-        """Return true if vacuum is currently cleaning."""
-        _LOGGER.debug("IS ON?")
-        return False
+    def poll_interval(self) -> float:
+        """Staleness window for the current working status."""
+        working_status = self.status.get('working_status')
+        if working_status in self.CLEANING_STATES:
+            return self.POLL_INTERVAL_CLEANING
+        if working_status in self.DOCKED_STATES:
+            return self.POLL_INTERVAL_DOCKED
+        return self.POLL_INTERVAL_DEFAULT
+    
+    def next_poll_in(self) -> float:
+        """Seconds until a poll is due, zero or less when status is stale."""
+        last_heard = max(self.last_status_at, self.last_poll_at)
+        return self.poll_interval - (time.monotonic() - last_heard)
     
     async def set_fan_speed(self, speed):
-        _LOGGER.debug("RobotController.set_fan_speed", speed)
+        _LOGGER.debug("RobotController.set_fan_speed %s", speed)
         await self.send_message('fan_status', speed)
     
     async def turn_on(self):
@@ -148,17 +175,134 @@ class RobotController:
         _LOGGER.debug("RobotController.return_to_base")
         await self.send_message('working_status', self.CHARGE_MODE_RETURNING)
     
-    async def send_message(self, key, value):
-        _LOGGER.debug("RobotController.send_message", self.weback_api)
-        await self.weback_api.send_command(self.name, self.sub_type, key, value)
+    async def send_message(self, key, value, wait=False, timeout=ACK_TIMEOUT):
+        """Queue a shadow write, repeated writes to the same key within the debounce window collapse into one.
+        
+        With wait, returns the round trip time in seconds once a status update shows the last value
+        queued for the key, or raises asyncio.TimeoutError, or FramesDropped when the write never went out.
+        """
+        _LOGGER.debug("RobotController.send_message %s=%s", key, value)
+        return await self.send_state({key: value}, wait=wait, timeout=timeout)
+    
+    async def send_state(self, state: dict, sync=False, wait=False, timeout=ACK_TIMEOUT):
+        """Queue several shadow keys at once, they go out in the same update. With sync, a sync_thing follows it.
+        
+        With wait, behaves like send_message.
+        """
+        _LOGGER.debug("RobotController.send_state %s sync=%s", state, sync)
+        
+        # A superseded value will never be acknowledged, earlier waiters follow the one that wins
+        for ack in self.queued_acks:
+            for key in ack.expected.keys() & state.keys():
+                ack.expected[key] = state[key]
+        
+        ack = None
+        if wait:
+            ack = self.expect(dict(state), timeout)
+            self.queued_acks.append(ack)
+        self.commands.put_state(state, sync)
+        if ack is not None:
+            return await ack.future
+    
+    async def send_command(self, state: dict, sync=False):
+        """Send a flush of the command queue, it carries every queued write to its keys."""
+        acks = [ack for ack in self.queued_acks if not ack.expected.keys() - state.keys()]
+        self.queued_acks = [ack for ack in self.queued_acks if ack not in acks]
+        # A refusal fails the acks through on_dropped right away
+        await self.weback_api.send_state(self.messages, state, sync, on_sent=partial(self.mark_sent, acks),
+                                         on_dropped=partial(self.fail_acks, acks))
+    
+    def expect(self, state: dict, timeout) -> CommandAck:
+        """Register a command whose completion is awaited, it fails after timeout seconds."""
+        loop = asyncio.get_running_loop()
+        ack = CommandAck(state, loop.create_future())
+        ack.timer = loop.call_later(timeout, self.ack_timeout, ack)
+        self.acks.append(ack)
+        return ack
+    
+    def mark_sent(self, acks):
+        """Start the round trip clock of the acks belonging to a frame, once it is on the socket."""
+        now = time.monotonic()
+        for ack in acks:
+            if ack.sent_at is None:
+                ack.sent_at = now
+    
+    def ack_timeout(self, ack: CommandAck):
+        self.fail_acks([ack], asyncio.TimeoutError())
+    
+    def fail_acks(self, acks, error):
+        """Fail commands that can no longer be acknowledged, timed out or dropped before sending."""
+        for ack in acks:
+            ack.timer.cancel()
+            if ack in self.acks:
+                self.acks.remove(ack)
+            if ack in self.queued_acks:
+                self.queued_acks.remove(ack)
+            if not ack.future.done():
+                ack.future.set_exception(error)
+    
+    def resolve_acks(self, received_at, thing_status):
+        for ack in list(self.acks):
+            # Only status received after the command went out can confirm it
+            if ack.sent_at is None or received_at < ack.sent_at:
+                continue
+            # and only an update that reports the keys the command set
+            if all(key in thing_status and str(thing_status[key]) == str(value)
+                   for key, value in ack.expected.items()):
+                ack.timer.cancel()
+                self.acks.remove(ack)
+                self.record_latency(received_at - ack.sent_at)
+                if not ack.future.done():
+                    ack.future.set_result(received_at - ack.sent_at)
+    
+    def record_latency(self, latency):
+        _LOGGER.debug("RobotController %s command round trip: %.3f s", self.name, latency)
+        self.command_latencies.append(latency)
+        self.last_command_latency = latency
+        self.median_command_latency = statistics.median(self.command_latencies)
+    
+    def stop(self):
+        """Drop queued commands and cancel every command still waiting for its acknowledgement."""
+        self.commands.cancel()
+        for ack in self.acks:
+            ack.timer.cancel()
+            if not ack.future.done():
+                ack.future.cancel()
+        self.acks.clear()
+        self.queued_acks.clear()
     
     def register_update_callback(self, callback):
-        self.weback_api.register_update_callback(callback)
-    
-    async def goto(self, point: str):
-        _LOGGER.debug("*** Goto (X,Y) location: " + point)
-        await self.weback_api.goto_command(self.name, self.sub_type, point)
-    
-    async def clean_rect(self, rectangle: str):
-        _LOGGER.debug("*** Clean rect: " + rectangle)
-        await self.weback_api.clean_rectangle_command(self.name, self.sub_type, rectangle)
+        self.update_callback = callback
+        self.weback_api.register_update_callback(self.name, self.status_received)
+    
+    def status_received(self, thing_status):
+        self.last_status_at = time.monotonic()
+        changed = self.apply_status(thing_status)
+        if self.status_request is not None:
+            self.status_request.set_result(None)
+            self.status_request = None
+        if self.acks:
+            self.resolve_acks(self.last_status_at, thing_status)
+        if changed and self.update_callback is not None:
+            self.update_callback(changed)
+    
+    def apply_status(self, thing_status) -> set:
+        """Merge a full or partial thing_status into the current one, return the keys that changed."""
+        status = self.status
+        changed = {key for key, value in thing_status.items() if key not in status or status[key] != value}
+        for key in changed:
+            status[key] = thing_status[key]
+        return changed
+    
+    async def goto(self, point):
+        """Send the robot to a point given as [x, y] or its JSON string."""
+        point = parse_coordinates(point, 2)
+        _LOGGER.debug("*** Goto (X,Y) location: %s", point)
+        await self.send_state({'working_status': self.ROBOT_PLANNING_LOCATION, 'goto_point': point}, sync=True)
+    
+    async def clean_rect(self, rectangle):
+        """Clean the rectangle given as [x1, y1, x2, y2] or its JSON string."""
+        rectangle = parse_coordinates(rectangle, 4)
+        _LOGGER.debug("*** Clean rect: %s", rectangle)
+        await self.send_state({'working_status': self.ROBOT_PLANNING_RECT, 'virtual_rect_info': rectangle},
+                              sync=True)
@@ -0,0 +1,167 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+
+import httpx
+
+from .ConnectionMetrics import ConnectionMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+AUTH_URL = "https://user.grit-cloud.com/prod/oauth"
+
+# Used when the token carries no readable exp claim
+TOKEN_LIFETIME = 24 * 3600
+# Treat a token as expired slightly early so it never dies mid-request
+TOKEN_EXPIRY_MARGIN = 300
+
+# HTTP statuses meaning the cloud refused our token
+AUTH_REJECTED = {401, 403}
+
+
+def token_expiry(jwt_token) -> float:
+    """Return the wall-clock expiry of a JWT, read from its exp claim."""
+    try:
+        payload = jwt_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return time.time() + TOKEN_LIFETIME
+
+
+class TokenManager:
+    """Login state of one WeBack account, shared by every session opened with it.
+
+    Refreshes are single-flight: however many requests see the token rejected at once,
+    one login runs and all of them continue with its result. login_limit, a semaphore shared
+    by the accounts, bounds how many of them log in at the same time.
+    """
+
+    def __init__(self, user, password, region, client, auth_url=AUTH_URL, metrics: ConnectionMetrics = None):
+        self.user = user
+        self.password = password
+        self.region = region
+        self.client = client
+        self.auth_url = auth_url
+        self.metrics = metrics or ConnectionMetrics()
+        self.jwt_token = None
+        self.region_name = None
+        self.wss_url = None
+        self.api_url = None
+        self.expires_at = 0.0
+        self.refresh_task = None
+        self.login_limit = None
+        self.listeners = []
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at - TOKEN_EXPIRY_MARGIN < time.time()
+
+    def add_listener(self, listener):
+        """Call listener() after every successful login, returns a function removing it."""
+        self.listeners.append(listener)
+        return lambda: self.listeners.remove(listener)
+
+    async def login(self) -> bool:
+        data = {
+            "payload": {
+                "opt": "login",
+                "pwd": hashlib.md5(self.password.encode()).hexdigest()
+            },
+            "header": {
+                "language": "es",
+                "app_name": "WeBack",
+                "calling_code": "00" + self.region,
+                "api_version": "1.0",
+                "account": self.user,
+                "client_id": "yugong_app"
+            }
+        }
+
+        _LOGGER.debug("LOG URL: %s", self.auth_url)
+
+        r = await self.client().post(self.auth_url, json=data)
+        _LOGGER.debug("LOG response: %s", r.status_code)
+
+        if r.status_code == 200:
+            json_response = r.json()
+            if json_response['msg'] == 'success':
+                _LOGGER.debug("TokenManager login successful for %s", self.user)
+
+                self.jwt_token = json_response['data']['jwt_token']
+                self.region_name = json_response['data']['region_name']
+                self.wss_url = json_response['data']['wss_url']
+                self.api_url = json_response['data']['api_url']
+                self.expires_at = token_expiry(self.jwt_token)
+
+                for listener in list(self.listeners):
+                    listener()
+                return True
+            else:
+                _LOGGER.error("WebackVacuumApi can't login (2) - verify user/password/region")
+        else:
+            _LOGGER.error("WebackVacuumApi can't login - verify user/password/region")
+
+        return False
+
+    async def refresh(self, rejected_token=None) -> bool:
+        """Log in again because rejected_token was refused, joining a refresh already running."""
+        if self.jwt_token is not None and self.jwt_token != rejected_token and not self.expired:
+            # Another request already replaced the rejected token
+            return True
+
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self.run_refresh())
+        return await asyncio.shield(self.refresh_task)
+
+    async def run_refresh(self) -> bool:
+        try:
+            if self.login_limit is None:
+                return await self.timed_login()
+            async with self.login_limit:
+                return await self.timed_login()
+        finally:
+            self.refresh_task = None
+
+    async def timed_login(self) -> bool:
+        started = time.perf_counter()
+        ok = False
+        try:
+            ok = await self.login()
+            return ok
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            _LOGGER.warning("Weback login for %s failed: %s", self.user, e)
+            return False
+        finally:
+            self.metrics.observe("login", started, ok)
+
+    async def valid_token(self) -> bool:
+        """Make sure an unexpired token is at hand, logging in when there is none."""
+        if self.jwt_token is None or self.expired:
+            return await self.refresh(self.jwt_token)
+        return True
+
+    def export(self) -> dict:
+        """Return the login results worth persisting across restarts."""
+        return {
+            "jwt_token": self.jwt_token,
+            "region_name": self.region_name,
+            "wss_url": self.wss_url,
+            "api_url": self.api_url,
+            "expires_at": self.expires_at,
+        }
+
+    def restore(self, session) -> bool:
+        """Reuse a persisted login, returns False when it is missing or expired."""
+        if not session or session.get("expires_at", 0) - TOKEN_EXPIRY_MARGIN < time.time():
+            return False
+
+        self.jwt_token = session["jwt_token"]
+        self.region_name = session["region_name"]
+        self.wss_url = session["wss_url"]
+        self.api_url = session["api_url"]
+        self.expires_at = session["expires_at"]
+        return True
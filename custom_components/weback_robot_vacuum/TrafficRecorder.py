@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+
+from .MessageCodec import dumps, loads
+
+_LOGGER = logging.getLogger(__name__)
+
+TRAFFIC_IN = "in"
+TRAFFIC_OUT = "out"
+
+TRACE_MAX_BYTES = 10 * 2 ** 20
+TRACE_BACKUPS = 3
+# Frames are batched for this long before a write is handed to the executor
+FLUSH_DELAY = 1.0
+
+
+class TrafficRecorder:
+    """Append-only trace of the socket frames of one account.
+
+    Every line is a JSON array [monotonic time, "in" or "out", frame]. Files are written from the
+    executor, never the event loop, and rotated to path.1 ... path.N past max_bytes.
+    """
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lines = []
+        self.flush_task = None
+        self.write_lock = asyncio.Lock()
+
+    def record(self, direction, frame):
+        self.lines.append(dumps([round(time.monotonic(), 6), direction, frame]))
+        if self.flush_task is None:
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_later())
+
+    async def flush_later(self):
+        try:
+            while self.lines:
+                await asyncio.sleep(FLUSH_DELAY)
+                await self.flush()
+        finally:
+            self.flush_task = None
+
+    async def flush(self):
+        async with self.write_lock:
+            lines, self.lines = self.lines, []
+            if lines:
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, self.write, lines)
+                except OSError as e:
+                    _LOGGER.warning("TrafficRecorder can't write %s: %s", self.path, e)
+
+    async def close(self):
+        # The lock lets a write already in the executor finish before the last one starts
+        await self.flush()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+
+    def write(self, lines):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as trace:
+            trace.write("\n".join(lines) + "\n")
+            size = trace.tell()
+        if size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        if self.backups:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+
+
+def read_trace(path) -> list:
+    """Return the [time, direction, frame] records of a trace, ValueError on any malformed line."""
+    records = []
+    with open(path, encoding="utf-8") as trace:
+        for number, line in enumerate(trace, 1):
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+            except ValueError:
+                record = None
+            if (
+                not isinstance(record, list)
+                or len(record) != 3
+                or isinstance(record[0], bool)
+                or not isinstance(record[0], (int, float))
+                or record[1] not in (TRAFFIC_IN, TRAFFIC_OUT)
+                or not isinstance(record[2], str)
+            ):
+                raise ValueError(f"Malformed trace record on line {number}")
+            records.append(record)
+    return records
+
+
+async def replay(path, weback_api, speed=1.0) -> int:
+    """Feed the inbound frames of a trace to weback_api as if they came from the socket.
+
+    speed scales the recorded gaps between frames, 0 replays them as fast as possible.
+    Returns the number of frames replayed.
+    """
+    records = await asyncio.get_running_loop().run_in_executor(None, read_trace, path)
+    started = time.monotonic()
+    first = None
+    count = 0
+
+    for recorded_at, direction, frame in records:
+        if direction != TRAFFIC_IN:
+            continue
+        if first is None:
+            first = recorded_at
+
+        if speed > 0:
+            delay = (recorded_at - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 100 == 0:
+            # Let the rest of the loop breathe during a full speed replay
+            await asyncio.sleep(0)
+
+        weback_api.handle_frame(frame)
+        count += 1
+
+    return count
@@ -0,0 +1,204 @@
+import asyncio
+from datetime import timedelta
+import logging
+import statistics
+import time
+
+import aiohttp
+import httpx
+
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .ConnectionSupervisor import ConnectionSupervisor
+from .RobotController import RobotController
+
+_LOGGER = logging.getLogger(__name__)
+
+SIGNAL_ROBOT_ADDED = "weback_robot_vacuum_robot_added"
+
+DISCOVERY_RETRY_MIN = 10
+DISCOVERY_RETRY_MAX = 600
+
+# Floor for the adaptive fleet poll interval
+FLEET_POLL_MIN = 10
+
+# Status given to robots restored from cache until the cloud reports on them
+OFFLINE_STATUS = {"connected": "false"}
+
+
+class WebackAccount:
+    """Cloud session and robots of one WeBack account."""
+
+    def __init__(self, hass, weback_api, store, cache, account_key, scan_interval, adaptive_polling=True,
+                 login_limit=None):
+        self.hass = hass
+        self.scan_interval = scan_interval
+        self.adaptive_polling = adaptive_polling
+        self.weback_api = weback_api
+        # Store and cache are shared by all accounts, each one only touches its own key
+        self.store = store
+        self.cache = cache
+        self.account_key = account_key
+        self.robots = {}
+        self.discovery_task = None
+        self.supervisor = ConnectionSupervisor(weback_api, self.async_resubscribe)
+        # Bounded across accounts, so a large config does not log in everywhere at once
+        weback_api.tokens.login_limit = login_limit
+        weback_api.tokens.add_listener(self.token_refreshed)
+        self.coordinator = DataUpdateCoordinator(
+            hass,
+            _LOGGER,
+            name="weback_robot_vacuum " + account_key,
+            update_method=self.async_update_fleet,
+            update_interval=scan_interval,
+        )
+
+    def restore(self):
+        """Restore the cached session and robot list without contacting the cloud."""
+        cached = self.cache.get(self.account_key, {})
+
+        if self.weback_api.tokens.restore(cached.get("session")):
+            _LOGGER.debug("WebackAccount %s: reusing cached session", self.account_key)
+
+        for robot in cached.get("robots", []):
+            self.add_robot(robot, dict(OFFLINE_STATUS))
+
+    def async_start(self):
+        """Run discovery in the background so startup never waits on the cloud."""
+        self.discovery_task = self.hass.async_create_background_task(
+            self.async_discover(), "weback_robot_vacuum discovery " + self.account_key
+        )
+
+    async def async_stop(self):
+        if self.discovery_task is not None:
+            self.discovery_task.cancel()
+        await self.supervisor.stop()
+        for robot in self.robots.values():
+            robot.stop()
+        await self.weback_api.close()
+
+    async def async_discover(self):
+        """Fetch the robot list, retrying with exponential backoff until the cloud answers."""
+        delay = DISCOVERY_RETRY_MIN
+
+        while True:
+            try:
+                robots = await self.fetch_robots()
+                if robots is not None:
+                    _LOGGER.debug("Weback vacuum robots: %s", robots)
+                    self.update_robots(robots)
+                    break
+            except (httpx.HTTPError, aiohttp.ClientError, KeyError, ValueError) as e:
+                _LOGGER.debug("WebackAccount %s: discovery error: %s", self.account_key, e)
+
+            _LOGGER.warning("Weback cloud unavailable for %s, retrying in %s s", self.account_key, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DISCOVERY_RETRY_MAX)
+
+        await self.async_save()
+        self.supervisor.start()
+
+    def token_refreshed(self):
+        # Keep the persisted session in step so a restart picks up the new token
+        self.hass.async_create_task(self.async_save())
+
+    async def async_resubscribe(self):
+        """Ask for the status of every robot on a fresh connection.
+
+        Goes through RobotController.update, so robots heard from within STATUS_TTL are skipped and
+        a poll already in flight is joined. The requests leave back to back through the outbound buffer.
+        """
+        await asyncio.gather(*(robot.update() for robot in self.robots.values()))
+
+    async def async_update_fleet(self):
+        """One poll cycle for every robot of the account, a single user_thing_list_get when any is stale."""
+        if not self.adaptive_polling or any(robot.next_poll_in() <= 0 for robot in self.robots.values()):
+            try:
+                robots = await self.fetch_robots()
+                if robots is not None:
+                    self.update_robots(robots)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                raise UpdateFailed(f"Error polling Weback cloud: {e}") from e
+            if robots is None:
+                raise UpdateFailed("Weback cloud did not return the robot list")
+
+        if self.adaptive_polling:
+            # Sleep until the first robot goes stale, pushes keep moving that point back
+            next_poll = min(
+                (robot.next_poll_in() for robot in self.robots.values()),
+                default=self.scan_interval.total_seconds(),
+            )
+            self.coordinator.update_interval = timedelta(seconds=max(next_poll, FLEET_POLL_MIN))
+
+        return {robot.name: robot.status for robot in self.robots.values()}
+
+    async def fetch_robots(self):
+        """Return the cloud robot list, None when it could not be fetched."""
+        # robot_list logs in when the session is missing and refreshes a rejected token
+        robots = await self.weback_api.robot_list()
+        if robots is None or robots is False:
+            return None
+        return robots
+
+    def update_robots(self, robots):
+        """Apply a fresh robot list: refresh known robots, announce new ones."""
+        for robot in robots:
+            controller = self.robots.get(robot["thing_name"])
+
+            if controller is None:
+                _LOGGER.info(
+                    "Discovered Weback robot %s with nickname %s",
+                    robot["thing_name"],
+                    robot["thing_nickname"],
+                )
+                controller = self.add_robot(robot, robot["thing_status"])
+                async_dispatcher_send(self.hass, SIGNAL_ROBOT_ADDED, self, controller)
+            else:
+                controller.nickname = robot["thing_nickname"]
+                controller.status_received(robot["thing_status"])
+
+    def add_robot(self, robot, thing_status) -> RobotController:
+        controller = RobotController(robot["thing_name"], robot["thing_nickname"], robot["sub_type"], thing_status,
+                                     self.weback_api)
+        self.robots[controller.name] = controller
+        return controller
+
+    @property
+    def median_command_latency(self):
+        """Median command round trip over every robot of the account, None before any command."""
+        latencies = [latency for robot in self.robots.values() for latency in robot.command_latencies]
+        return statistics.median(latencies) if latencies else None
+
+    def diagnostics(self) -> dict:
+        """Connection metrics and per-robot staleness, for the get_metrics service."""
+        now = time.monotonic()
+        return {
+            "account": self.account_key,
+            "socket_state": self.weback_api.socket_state,
+            "consecutive_failures": self.supervisor.consecutive_failures,
+            "dropped_frames": self.weback_api.dropped_frames,
+            "outbound_pending": len(self.weback_api.outbound),
+            "unknown_notify": dict(self.weback_api.unknown_notify_counts),
+            "metrics": self.weback_api.metrics.as_dict(),
+            "robots": {
+                robot.name: {
+                    "status_age_s": round(now - robot.last_status_at, 1) if robot.last_status_at else None,
+                    "median_command_latency_ms": (
+                        round(robot.median_command_latency * 1000) if robot.median_command_latency is not None
+                        else None
+                    ),
+                }
+                for robot in self.robots.values()
+            },
+        }
+
+    async def async_save(self):
+        self.cache[self.account_key] = {
+            "session": self.weback_api.tokens.export(),
+            "robots": [
+                {"thing_name": robot.name, "thing_nickname": robot.nickname, "sub_type": robot.sub_type}
+                for robot in self.robots.values()
+            ],
+        }
+        await self.store.async_save(self.cache)
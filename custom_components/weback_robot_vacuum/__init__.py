@@ -1,82 +1,235 @@
 """Support for WeBack robot vacuums."""
 
+import asyncio
 from datetime import timedelta
 import logging
+import os
 import random
 import string
 
+import httpx
 import voluptuous as vol
 
 
-from homeassistant.const import CONF_PASSWORD, CONF_SCAN_INTERVAL, CONF_USERNAME
+from homeassistant.const import (
+    CONF_PASSWORD,
+    CONF_SCAN_INTERVAL,
+    CONF_USERNAME,
+    EVENT_HOMEASSISTANT_STOP,
+)
+from homeassistant.core import SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.entity import DeviceInfo
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-)
+from homeassistant.helpers.storage import Store
+from homeassistant.util.ssl import get_default_context
+
+from .RobotController import RobotController
+from .TrafficRecorder import TrafficRecorder, replay
+from .WebackAccount import WebackAccount
+from .WebackVacuumApi import HANDSHAKE_TIMEOUT, HTTP_LIMITS, HTTP_TIMEOUT, TRACE_LOGGER, WebackVacuumApi
 
 _LOGGER = logging.getLogger(__name__)
 
 DOMAIN        = "weback_robot_vacuum"
 SCAN_INTERVAL = timedelta(seconds=60)
 CONF_REGION   = 'region'
+CONF_HANDSHAKE_TIMEOUT = 'handshake_timeout'
+CONF_HTTP2    = 'http2'
+CONF_ADAPTIVE_POLLING = 'adaptive_polling'
+CONF_ACCOUNTS = 'accounts'
+CONF_PARALLEL_LOGINS = 'parallel_logins'
+CONF_RECORD_TRAFFIC = 'record_traffic'
+CONF_METRICS_SENSORS = 'metrics_sensors'
+
+# Accounts logging in and discovering robots at the same time
+PARALLEL_LOGINS = 4
+
+STORAGE_VERSION = 1
+STORAGE_KEY     = DOMAIN
+
+# Traces are written to <config>/weback_traffic/<username>_<region>.jsonl
+TRAFFIC_DIR = "weback_traffic"
+
+SERVICE_REPLAY_TRAFFIC = "replay_traffic"
+SERVICE_GET_METRICS = "get_metrics"
+SERVICE_SET_TRACE = "set_trace"
+ATTR_ENABLED = "enabled"
+ATTR_PATH = "path"
+ATTR_SPEED = "speed"
+
+REPLAY_TRAFFIC_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_PATH): cv.string,
+        vol.Optional(ATTR_SPEED, default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(CONF_USERNAME): cv.string,
+    }
+)
+
+SET_TRACE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENABLED): cv.boolean,
+        vol.Optional(CONF_USERNAME): cv.string,
+    }
+)
+
+ACCOUNT_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_USERNAME): cv.string,
+        vol.Required(CONF_PASSWORD): cv.string,
+        vol.Required(CONF_REGION): cv.string,
+    }
+)
+
+
+def single_account(config):
+    """Accept the original single-account layout as a one-entry accounts list."""
+    if CONF_ACCOUNTS not in config and CONF_USERNAME in config:
+        config = dict(config)
+        config[CONF_ACCOUNTS] = [
+            {key: config.pop(key) for key in (CONF_USERNAME, CONF_PASSWORD, CONF_REGION) if key in config}
+        ]
+    return config
+
 
 CONFIG_SCHEMA = vol.Schema(
     {
-        DOMAIN: vol.Schema(
-            {
-                vol.Required(CONF_USERNAME): cv.string,
-                vol.Required(CONF_PASSWORD): cv.string,
-                vol.Required(CONF_REGION): cv.string,
-            }
+        DOMAIN: vol.All(
+            single_account,
+            vol.Schema(
+                {
+                    vol.Required(CONF_ACCOUNTS): vol.All(cv.ensure_list, [ACCOUNT_SCHEMA], vol.Length(min=1)),
+                    vol.Optional(CONF_HANDSHAKE_TIMEOUT, default=HANDSHAKE_TIMEOUT): vol.All(
+                        vol.Coerce(float), vol.Range(min=1)
+                    ),
+                    vol.Optional(CONF_HTTP2, default=False): cv.boolean,
+                    vol.Optional(CONF_ADAPTIVE_POLLING, default=True): cv.boolean,
+                    vol.Optional(CONF_PARALLEL_LOGINS, default=PARALLEL_LOGINS): vol.All(
+                        vol.Coerce(int), vol.Range(min=1)
+                    ),
+                    vol.Optional(CONF_RECORD_TRAFFIC, default=False): cv.boolean,
+                    vol.Optional(CONF_METRICS_SENSORS, default=False): cv.boolean,
+                }
+            ),
         )
     },
     extra=vol.ALLOW_EXTRA,
 )
 
 
-from .RobotController import RobotController
-from .WebackVacuumApi import WebackVacuumApi
-
 async def async_setup(hass, config):
     """Set up the Weback component."""
     _LOGGER.debug("Creating new Weback Vacuum Robot component")
 
+    conf = config[DOMAIN]
+    store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+    cache = await store.async_load() or {}
+    login_limit = asyncio.Semaphore(conf[CONF_PARALLEL_LOGINS])
+
     hass.data[DOMAIN] = []
 
-    weback_api = WebackVacuumApi(
-        config[DOMAIN].get(CONF_USERNAME), 
-        config[DOMAIN].get(CONF_PASSWORD),
-        config[DOMAIN].get(CONF_REGION),
-    )
+    http2 = conf[CONF_HTTP2]
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            _LOGGER.warning("Weback http2 requires the h2 package, using HTTP/1.1")
+            http2 = False
+
+    for account_conf in conf[CONF_ACCOUNTS]:
+        recorder = None
+        if conf[CONF_RECORD_TRAFFIC]:
+            recorder = TrafficRecorder(hass.config.path(
+                TRAFFIC_DIR, account_conf[CONF_USERNAME] + "_" + account_conf[CONF_REGION] + ".jsonl"
+            ))
+
+        # Every account gets its own socket, HTTP pool and token, nothing is shared between them
+        weback_api = WebackVacuumApi(
+            account_conf[CONF_USERNAME],
+            account_conf[CONF_PASSWORD],
+            account_conf[CONF_REGION],
+            async_get_clientsession(hass),
+            conf[CONF_HANDSHAKE_TIMEOUT],
+            # Not create_async_httpx_client, which fixes its own pool limits. The SSL context is
+            # Home Assistant's cached one, so building the client does not block the loop
+            httpx.AsyncClient(
+                verify=get_default_context(),
+                http2=http2,
+                timeout=HTTP_TIMEOUT,
+                limits=HTTP_LIMITS,
+            ),
+            recorder=recorder,
+        )
 
-    _LOGGER.debug("Weback vacuum robots: login started")
-    await weback_api.login()    
-    robots = await weback_api.robot_list()
-    
-    _LOGGER.debug("Weback vacuum robots: %s", robots)
-
-    for robot in robots:
-        _LOGGER.info(
-            "Discovered Weback robot %s with nickname %s",
-            robot["thing_name"],
-            robot["thing_nickname"],
+        account = WebackAccount(
+            hass,
+            weback_api,
+            store,
+            cache,
+            account_conf[CONF_USERNAME] + "@" + account_conf[CONF_REGION],
+            SCAN_INTERVAL,
+            conf[CONF_ADAPTIVE_POLLING],
+            login_limit,
         )
+        hass.data[DOMAIN].append(account)
 
-        robot_controller = RobotController(robot["thing_name"], robot["thing_nickname"], robot["sub_type"], robot["thing_status"], weback_api.clone())
-        hass.data[DOMAIN].append(robot_controller)
+        # Entities are created from the last known robot list, the cloud is queried in the background
+        account.restore()
+        account.async_start()
 
-    if hass.data[DOMAIN]:
-        _LOGGER.debug("Starting vacuum robot components")
-        hass.helpers.discovery.load_platform("vacuum", DOMAIN, {}, config)
+    async def async_stop_accounts(event):
+        await asyncio.gather(*(account.async_stop() for account in hass.data[DOMAIN]))
 
-    return True
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_accounts)
+
+    async def async_replay_traffic(call):
+        """Feed a recorded trace to an account's socket handlers, and so to its entities."""
+        username = call.data.get(CONF_USERNAME)
+        accounts = [account for account in hass.data[DOMAIN] if username in (None, account.weback_api.user)]
+        if not accounts:
+            raise HomeAssistantError(f"No Weback account {username}")
+
+        # Only traces under the traffic directory can be replayed, never arbitrary files
+        traffic_dir = os.path.realpath(hass.config.path(TRAFFIC_DIR))
+        path = os.path.realpath(os.path.join(traffic_dir, call.data[ATTR_PATH]))
+        if os.path.commonpath([traffic_dir, path]) != traffic_dir:
+            raise HomeAssistantError(f"Traces can only be replayed from {traffic_dir}")
+
+        try:
+            frames = await replay(path, accounts[0].weback_api, call.data[ATTR_SPEED])
+        except (OSError, ValueError) as e:
+            raise HomeAssistantError(f"Can't replay {path}: {e}") from e
+        _LOGGER.info("Replayed %s frames from %s", frames, path)
 
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name=DOMAIN,
-        update_method=async_update_data,
-        update_interval=timedelta(seconds=60),
+    hass.services.async_register(DOMAIN, SERVICE_REPLAY_TRAFFIC, async_replay_traffic, schema=REPLAY_TRAFFIC_SCHEMA)
+
+    async def async_get_metrics(call):
+        """Return counters, latency histograms and robot staleness of every account."""
+        return {"accounts": [account.diagnostics() for account in hass.data[DOMAIN]]}
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_METRICS, async_get_metrics, supports_response=SupportsResponse.ONLY
     )
+
+    async def async_set_trace(call):
+        """Switch the per-frame trace of one account, or all of them, on or off."""
+        username = call.data.get(CONF_USERNAME)
+        for account in hass.data[DOMAIN]:
+            if username in (None, account.weback_api.user):
+                account.weback_api.trace = call.data[ATTR_ENABLED]
+                _LOGGER.info("Weback frame trace for %s: %s", account.account_key, call.data[ATTR_ENABLED])
+
+        # The trace lines are INFO, make them visible even when the default log level is higher
+        tracing = any(account.weback_api.trace for account in hass.data[DOMAIN])
+        logging.getLogger(TRACE_LOGGER).setLevel(logging.INFO if tracing else logging.NOTSET)
+
+    hass.services.async_register(DOMAIN, SERVICE_SET_TRACE, async_set_trace, schema=SET_TRACE_SCHEMA)
+
+    _LOGGER.debug("Starting vacuum robot components")
+    hass.helpers.discovery.load_platform("vacuum", DOMAIN, {}, config)
+    hass.helpers.discovery.load_platform("binary_sensor", DOMAIN, {}, config)
+    if conf[CONF_METRICS_SENSORS]:
+        hass.helpers.discovery.load_platform("sensor", DOMAIN, {}, config)
+
+    return True
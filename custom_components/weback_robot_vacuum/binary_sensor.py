@@ -0,0 +1,48 @@
+"""Cloud connectivity of Weback accounts."""
+import logging
+
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+)
+from homeassistant.core import callback
+
+from . import DOMAIN
+from .WebackVacuumApi import SOCK_OPEN
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up a Weback cloud connection sensor per account."""
+    async_add_entities([WebackConnectionSensor(account) for account in hass.data[DOMAIN]])
+
+
+class WebackConnectionSensor(BinarySensorEntity):
+    """On while the account's WebSocket to the Weback cloud is open."""
+    
+    _attr_device_class = BinarySensorDeviceClass.CONNECTIVITY
+    _attr_should_poll = False
+    
+    def __init__(self, account):
+        self.account = account
+        self._attr_name = "Weback cloud connection " + account.weback_api.user
+        self._attr_unique_id = account.account_key + "_cloud_connection"
+    
+    async def async_added_to_hass(self):
+        self.async_on_remove(self.account.supervisor.add_listener(self.connection_changed))
+    
+    @callback
+    def connection_changed(self):
+        self.async_write_ha_state()
+    
+    @property
+    def is_on(self):
+        return self.account.weback_api.socket_state == SOCK_OPEN
+    
+    @property
+    def extra_state_attributes(self):
+        return {
+            "socket_state": self.account.weback_api.socket_state,
+            "consecutive_failures": self.account.supervisor.consecutive_failures,
+        }
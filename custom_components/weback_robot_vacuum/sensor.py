@@ -0,0 +1,109 @@
+"""Cloud connection metrics of Weback accounts."""
+from datetime import datetime, timedelta, timezone
+import logging
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
+from homeassistant.const import UnitOfTime
+from homeassistant.core import callback
+from homeassistant.helpers.entity import EntityCategory
+
+from . import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
+    """Set up the metric sensors of every account."""
+    sensors = []
+    for account in hass.data[DOMAIN]:
+        sensors += [
+            WebackConnectedSinceSensor(account),
+            WebackReconnectsSensor(account),
+            WebackLastPushSensor(account),
+            WebackCommandLatencySensor(account),
+        ]
+    async_add_entities(sensors)
+
+
+def timestamp(wall_clock):
+    return datetime.fromtimestamp(wall_clock, timezone.utc) if wall_clock is not None else None
+
+
+class WebackMetricSensor(SensorEntity):
+    """One figure of an account's ConnectionMetrics, polled every SCAN_INTERVAL."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, account, name, key):
+        self.account = account
+        self.metrics = account.weback_api.metrics
+        self._attr_name = "Weback " + name + " " + account.weback_api.user
+        self._attr_unique_id = account.account_key + "_" + key
+
+
+class WebackConnectedSinceSensor(WebackMetricSensor):
+    """When the current socket opened, unknown while disconnected."""
+
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_should_poll = False
+
+    def __init__(self, account):
+        super().__init__(account, "connected since", "connected_since")
+
+    async def async_added_to_hass(self):
+        self.async_on_remove(self.account.supervisor.add_listener(self.connection_changed))
+
+    @callback
+    def connection_changed(self):
+        self.async_write_ha_state()
+
+    @property
+    def native_value(self):
+        return timestamp(self.metrics.connected_since)
+
+
+class WebackReconnectsSensor(WebackMetricSensor):
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = "reconnects/h"
+
+    def __init__(self, account):
+        super().__init__(account, "reconnects last hour", "reconnects_last_hour")
+
+    @property
+    def native_value(self):
+        return self.metrics.reconnects_last_hour
+
+
+class WebackLastPushSensor(WebackMetricSensor):
+    """Time of the last frame from the cloud, polled rather than written on every push."""
+
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+
+    def __init__(self, account):
+        super().__init__(account, "last push", "last_push")
+
+    @property
+    def native_value(self):
+        return timestamp(self.metrics.last_receive_at)
+
+
+class WebackCommandLatencySensor(WebackMetricSensor):
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+
+    def __init__(self, account):
+        super().__init__(account, "median command latency", "median_command_latency")
+
+    @property
+    def native_value(self):
+        latency = self.account.median_command_latency
+        return round(latency * 1000) if latency is not None else None
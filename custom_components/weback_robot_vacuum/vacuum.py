@@ -1,6 +1,6 @@
 """Support for Weback Vaccum Robots."""
+import asyncio
 import logging
-import datetime
 from functools import partial
 import voluptuous as vol
 import homeassistant.helpers.config_validation as cv
@@ -16,11 +16,24 @@ from homeassistant.components.vacuum import (
     STATE_ERROR
 )
 
+from homeassistant.core import callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.icon import icon_for_battery_level
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+    DataUpdateCoordinator,
+)
 
-from . import (DOMAIN, SCAN_INTERVAL)
+from . import DOMAIN
+from .LogSampler import LogSampler
+from .MessageCodec import parse_coordinates
+from .OutboundBuffer import FramesDropped
+from .RobotController import ACK_TIMEOUT
+from .WebackAccount import SIGNAL_ROBOT_ADDED
 
 _LOGGER = logging.getLogger(__name__)
+_SAMPLED = LogSampler(_LOGGER)
 
 from . import RobotController
 
@@ -64,40 +77,108 @@ ATTR_POINT = "point"
 SERVICE_CLEAN_RECTANGLE = 'clean_rectangle'
 ATTR_RECTANGLE = "rectangle"
 
+SERVICE_SEND_STATE = 'send_state'
+ATTR_STATE = "state"
+ATTR_SYNC = "sync"
+ATTR_WAIT = "wait"
+ATTR_TIMEOUT = "timeout"
+
 from homeassistant.helpers import entity_platform
 
 
+def coordinates(count):
+    """Service validator for a list of count numbers, given as a list or a "[x,y]" string."""
+    def validate(value):
+        try:
+            return parse_coordinates(value, count)
+        except ValueError as e:
+            raise vol.Invalid(str(e)) from e
+    
+    return validate
+
+
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the Weback robot vacuums."""
     vacuums = []
-    for device in hass.data[DOMAIN]:
-        vacuums.append(WebackVacuumRobot(device, SCAN_INTERVAL))
+    for account in hass.data[DOMAIN]:
+        for device in account.robots.values():
+            vacuums.append(WebackVacuumRobot(account.coordinator, device))
     
     platform = entity_platform.current_platform.get()
     platform.async_register_entity_service(
         SERVICE_GOTO_LOCATION,
         {
-            vol.Required(ATTR_POINT): cv.string,
+            vol.Required(ATTR_POINT): coordinates(2),
         }, "async_goto_location"
     )
     
     platform.async_register_entity_service(
         SERVICE_CLEAN_RECTANGLE,
         {
-            vol.Required(ATTR_RECTANGLE): cv.string,
+            vol.Required(ATTR_RECTANGLE): coordinates(4),
         }, "async_clean_rectangle"
     )
     
+    platform.async_register_entity_service(
+        SERVICE_SEND_STATE,
+        {
+            vol.Required(ATTR_STATE): vol.All(dict, vol.Length(min=1)),
+            vol.Optional(ATTR_SYNC, default=False): cv.boolean,
+            vol.Optional(ATTR_WAIT, default=False): cv.boolean,
+            vol.Optional(ATTR_TIMEOUT, default=ACK_TIMEOUT): vol.All(vol.Coerce(float), vol.Range(min=1)),
+        }, "async_send_state"
+    )
+    
     _LOGGER.debug("Adding Weback Vacuums to Home Assistant: %s", vacuums)
-    async_add_entities(vacuums, True)
+    async_add_entities(vacuums)
+    
+    @callback
+    def async_robot_added(account, device):
+        async_add_entities([WebackVacuumRobot(account.coordinator, device)])
+    
+    async_dispatcher_connect(hass, SIGNAL_ROBOT_ADDED, async_robot_added)
+
+
+FAN_SPEED_LIST = [RobotController.FAN_SPEED_QUIET, RobotController.FAN_SPEED_NORMAL, RobotController.FAN_SPEED_HIGH]
+
+
+class VacuumSnapshot:
+    """Robot status parsed once per change, so entity properties are plain attribute reads."""
+    
+    __slots__ = ("state", "battery_level", "battery_icon", "is_available", "is_charging", "is_docked",
+                 "is_cleaning", "fan_speed", "error")
+    
+    def __init__(self, status):
+        # Robots restored from cache have no working status until the cloud reports on them
+        working_status = status.get('working_status', RobotController.CHARGE_MODE_IDLE)
+        
+        self.state = STATE_MAPPING.get(working_status)
+        if self.state is None:
+            _SAMPLED.error("STATE not supported, state_code: %s", working_status, key=working_status)
+        
+        try:
+            self.battery_level = int(status.get('battery_level', 100))
+        except (TypeError, ValueError):
+            self.battery_level = None
+        
+        self.is_available = status.get('connected') == 'true'
+        self.is_charging = working_status in RobotController.CHARGING_STATES
+        self.is_docked = working_status in RobotController.DOCKED_STATES
+        self.is_cleaning = working_status in RobotController.CLEANING_STATES
+        self.fan_speed = status.get('fan_status', RobotController.FAN_SPEED_NORMAL)
+        self.error = status.get('error_info')
+        self.battery_icon = icon_for_battery_level(battery_level=self.battery_level, charging=self.is_charging)
 
 
-class WebackVacuumRobot(StateVacuumEntity):
+class WebackVacuumRobot(CoordinatorEntity, StateVacuumEntity):
     """Weback Vacuums such as ABIR XS-X6."""
     
-    def __init__(self, device: RobotController, scan_interval: datetime.timedelta):
+    def __init__(self, coordinator: DataUpdateCoordinator, device: RobotController):
         """Initialize the Weback Vacuum."""
+        super().__init__(coordinator)
         self.device = device
+        self._write_pending = False
+        self._snapshot = VacuumSnapshot(device.status)
         
         self._attr_supported_features = (
                 VacuumEntityFeature.TURN_ON
@@ -117,112 +198,99 @@ class WebackVacuumRobot(StateVacuumEntity):
         
         _LOGGER.debug("Vacuum initialized: %s", self.name)
     
-    def device_updated(self, status):
-        _LOGGER.debug("device_updated", status)
-        self.device.status = status
-        self.schedule_update_ha_state(True)
-    
-    async def async_update(self):
-        _LOGGER.debug("Vacuum: async_update")
+    def device_updated(self, changed):
+        """Write state for a status change, safe to call from any thread."""
+        if not changed & RobotController.STATE_FIELDS:
+            return
         
-        """Update device's state"""
-        await self.device.update()
+        # Latest wins: a burst of pushes before the loop gets to it ends in a single state write
+        if self.hass is None or self._write_pending:
+            return
+        self._write_pending = True
+        self.hass.loop.call_soon_threadsafe(self.async_write_pushed_state)
+    
+    async def async_added_to_hass(self):
+        """Rebuild the snapshot from pushes that arrived before the entity was added."""
+        await super().async_added_to_hass()
+        self._snapshot = VacuumSnapshot(self.device.status)
+    
+    @callback
+    def async_write_pushed_state(self):
+        self._write_pending = False
+        self._snapshot = VacuumSnapshot(self.device.status)
+        self.async_write_ha_state()
+    
+    @callback
+    def _handle_coordinator_update(self):
+        # Fleet polls feed the same status path as pushes, device_updated already wrote any change
+        pass
     
     @property
     def error(self):
-        _LOGGER.debug("error")
-        return self.device.error_info
-    
-    @property
-    def should_poll(self) -> bool:
-        _LOGGER.debug("should_poll")
-        _LOGGER.debug(self.device.raw_status)
-        return True
+        return self._snapshot.error
     
     @property
     def unique_id(self) -> str:
         """Return an unique ID."""
-        _LOGGER.debug("Vacuum: unique_id", self.device.name)
         return self.device.name
     
     @property
     def is_on(self):
-        _LOGGER.debug("Vacuum: is_on", self.device.is_cleaning)
         """Return true if vacuum is currently cleaning."""
-        return self.device.is_cleaning
+        return self._snapshot.is_cleaning
     
     @property
     def available(self):
-        _LOGGER.debug("Vacuum: available", self.device.is_available)
         """Returns true if vacuum is online"""
-        return self.device.is_available
+        return self._snapshot.is_available
     
     @property
     def is_charging(self):
-        _LOGGER.debug("Vacuum: is_charging", self.device.is_charging)
         """Return true if vacuum is currently charging."""
-        return self.device.is_charging
+        return self._snapshot.is_charging
     
     @property
     def name(self):
-        _LOGGER.debug("Vacuum: name", self.device.nickname)
         """Return the name of the device."""
         return self.device.nickname
     
     @property
     def state(self):
-        _LOGGER.debug("Vacuum: STATE! Mapear el valor de " + self.device.current_mode)
         """Return the current state of the vacuum."""
-        
-        try:
-            _LOGGER.debug("MAPEADO ES: " + STATE_MAPPING[self.device.current_mode])
-            return STATE_MAPPING[self.device.current_mode]
-        except KeyError:
-            _LOGGER.error(
-                "STATE not supported, state_code: %s",
-                self.device.current_mode,
-            )
-            return None
+        return self._snapshot.state
     
     def return_to_base(self, **kwargs):
-        _LOGGER.debug("Vacuum: return_to_base")
         """Set the vacuum cleaner to return to the dock."""
+        _LOGGER.debug("Vacuum: return_to_base")
         self.device.return_home()
     
     @property
     def battery_icon(self):
-        _LOGGER.debug("Vacuum: battery_icon")
         """Return the battery icon for the vacuum cleaner."""
-        return icon_for_battery_level(
-            battery_level=self.battery_level, charging=self.is_charging
-        )
+        return self._snapshot.battery_icon
     
     @property
     def battery_charging(self):
-        _LOGGER.debug("Vacuum: battery_charging", self.is_charging)
         """Returns true when robot is charging"""
-        return self.is_charging
+        return self._snapshot.is_charging
     
     @property
     def battery_level(self):
-        _LOGGER.debug("Vacuum: battery_level", self.device.battery_level)
         """Return the battery level of the vacuum cleaner."""
-        return self.device.battery_level
+        return self._snapshot.battery_level
     
     @property
     def fan_speed(self):
-        _LOGGER.debug("Vacuum: fan_speed", self.device.fan_status)
         """Return the fan speed of the vacuum cleaner."""
-        return self.device.fan_status
+        return self._snapshot.fan_speed
     
     @property
     def fan_speed_list(self):
-        _LOGGER.debug("Vacuum: fan_speed_list", self.device.fan_speed_list)
         """Get the list of available fan speed steps of the vacuum cleaner."""
-        return self.device.fan_speed_list
+        return FAN_SPEED_LIST
     
     async def async_set_fan_speed(self, fan_speed, **kwargs):
-        _LOGGER.debug("Vacuum: set_fan_speed", fan_speed)
+        _LOGGER.debug("Vacuum: set_fan_speed %s", fan_speed)
         await self.device.set_fan_speed(fan_speed)
     
     async def async_pause(self):
@@ -240,18 +308,18 @@ class WebackVacuumRobot(StateVacuumEntity):
         await self.device.turn_on()
     
     def turn_off(self, **kwargs):
-        _LOGGER.debug("Vacuum: turn_off")
         """Turn the vacuum off stopping the cleaning and returning home."""
+        _LOGGER.debug("Vacuum: turn_off")
         self.return_to_base()
     
     async def async_stop(self, **kwargs):
-        _LOGGER.debug("Vacuum: stop")
         """Stop the vacuum cleaner."""
+        _LOGGER.debug("Vacuum: stop")
         await self.device.pause()
     
     async def async_clean_spot(self, **kwargs):
-        _LOGGER.debug("Vacuum: clean_spot")
         """Perform a spot clean-up."""
+        _LOGGER.debug("Vacuum: clean_spot")
         await self.device.clean_spot()
     
     async def async_locate(self, **kwargs) -> None:
@@ -264,10 +332,31 @@ class WebackVacuumRobot(StateVacuumEntity):
         _LOGGER.debug("Vacuum: async_return_to_base")
         await self.device.return_to_base()
     
-    async def async_goto_location(self, point: str):
-        _LOGGER.debug("*** async_goto_location location: " + point)
+    async def async_goto_location(self, point: list):
+        _LOGGER.debug("*** async_goto_location location: %s", point)
         await self.device.goto(point)
     
-    async def async_clean_rectangle(self, rectangle: str):
-        _LOGGER.debug("*** async_clean_rectangle: " + rectangle)
+    async def async_clean_rectangle(self, rectangle: list):
+        _LOGGER.debug("*** async_clean_rectangle: %s", rectangle)
         await self.device.clean_rect(rectangle)
+    
+    async def async_send_state(self, state: dict, sync=False, wait=False, timeout=ACK_TIMEOUT):
+        _LOGGER.debug("Vacuum: send_state %s", state)
+        try:
+            await self.device.send_state(state, sync, wait, timeout)
+        except asyncio.TimeoutError as e:
+            raise HomeAssistantError(
+                f"{self.name} did not confirm {state} within {timeout} s"
+            ) from e
+        except FramesDropped as e:
+            raise HomeAssistantError(f"{state} was not sent to {self.name}: {e}") from e
+    
+    @property
+    def extra_state_attributes(self):
+        """Round trip of commands confirmed by the robot, in milliseconds."""
+        if self.device.last_command_latency is None:
+            return None
+        return {
+            "last_command_latency": round(self.device.last_command_latency * 1000),
+            "median_command_latency": round(self.device.median_command_latency * 1000),
+        }
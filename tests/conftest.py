@@ -0,0 +1,8 @@
+"""The component modules under test are imported through bench.component_module, Home Assistant is not needed."""
+
+import pathlib
+import sys
+
+ROOT = str(pathlib.Path(__file__).resolve().parent.parent)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
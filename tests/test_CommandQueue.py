@@ -0,0 +1,77 @@
+import asyncio
+
+from bench import component_module
+
+CommandQueue = component_module("CommandQueue").CommandQueue
+
+
+def queue(sent):
+    async def send(state, sync):
+        sent.append((state, sync) if sync else state)
+    return CommandQueue(send, debounce=0.02, debounce_max=0.2, min_interval=0)
+
+
+def test_burst_to_one_key_sends_the_last_value():
+    async def scenario():
+        sent = []
+        commands = queue(sent)
+        for speed in ("Quiet", "Normal", "Strong"):
+            commands.put_state({"fan_status": speed})
+        await commands.sender
+        assert sent == [{"fan_status": "Strong"}]
+
+    asyncio.run(scenario())
+
+
+def test_burst_to_several_keys_sends_one_update():
+    async def scenario():
+        sent = []
+        commands = queue(sent)
+        commands.put_state({"fan_status": "Quiet"})
+        commands.put_state({"working_status": "AutoClean", "fan_status": "Strong"})
+        await commands.sender
+        assert sent == [{"working_status": "AutoClean", "fan_status": "Strong"}]
+
+    asyncio.run(scenario())
+
+
+def test_writes_after_a_flush_go_out_separately():
+    async def scenario():
+        sent = []
+        commands = queue(sent)
+        commands.put_state({"working_status": "AutoClean"})
+        await commands.sender
+        commands.put_state({"working_status": "Standby"})
+        await commands.sender
+        assert sent == [{"working_status": "AutoClean"}, {"working_status": "Standby"}]
+
+    asyncio.run(scenario())
+
+
+def test_cancel_drops_pending_writes():
+    async def scenario():
+        sent = []
+        commands = queue(sent)
+        commands.put_state({"working_status": "AutoClean"})
+        commands.cancel()
+        await asyncio.sleep(0.05)
+        assert sent == []
+
+    asyncio.run(scenario())
+
+
+def test_sync_is_sent_with_the_flush_that_carries_it():
+    async def scenario():
+        sent = []
+        commands = queue(sent)
+        commands.put_state({"goto_point": [1, 2]}, sync=True)
+        commands.put_state({"working_status": "PlanningLocation"})
+        await commands.sender
+        commands.put_state({"working_status": "Standby"})
+        await commands.sender
+        assert sent == [
+            ({"goto_point": [1, 2], "working_status": "PlanningLocation"}, True),
+            {"working_status": "Standby"},
+        ]
+
+    asyncio.run(scenario())
@@ -0,0 +1,64 @@
+import logging
+
+from bench import component_module
+
+sampler = component_module("LogSampler")
+LogSampler = sampler.LogSampler
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def sampled(caplog, monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(sampler.time, "monotonic", clock)
+    caplog.set_level(logging.DEBUG, logger="weback.test")
+    return LogSampler(logging.getLogger("weback.test"), interval=60, **kwargs), clock
+
+
+def test_repeats_within_the_interval_are_suppressed(caplog, monkeypatch):
+    log, clock = sampled(caplog, monkeypatch)
+    for _ in range(5):
+        log.warning("socket dropped %s", "robot-1")
+    clock.now += 61
+    log.warning("socket dropped %s", "robot-1")
+    assert [record.getMessage() for record in caplog.records] == [
+        "socket dropped robot-1",
+        "socket dropped robot-1 (4 similar messages suppressed)",
+    ]
+
+
+def test_keys_are_sampled_separately(caplog, monkeypatch):
+    log, _ = sampled(caplog, monkeypatch)
+    log.debug("frame from %s", "robot-1", key="robot-1")
+    log.debug("frame from %s", "robot-2", key="robot-2")
+    log.debug("frame from %s", "robot-1", key="robot-1")
+    assert len(caplog.records) == 2
+
+
+def test_disabled_level_costs_nothing(caplog, monkeypatch):
+    log, _ = sampled(caplog, monkeypatch)
+    caplog.set_level(logging.WARNING, logger="weback.test")
+    log.debug("frame")
+    assert caplog.records == []
+    assert not log.logged_at
+
+
+def test_at_most_max_keys_are_remembered(caplog, monkeypatch):
+    log, _ = sampled(caplog, monkeypatch, max_keys=3)
+    for n in range(10):
+        log.debug("frame %s", n, key=n)
+        log.debug("frame %s", n, key=n)
+    assert list(log.logged_at) == [7, 8, 9]
+    assert set(log.suppressed) == {7, 8, 9}
+
+    # A forgotten key logs again at once
+    log.debug("frame %s", 0, key=0)
+    assert caplog.records[-1].getMessage() == "frame 0"
+    assert 7 not in log.logged_at
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from bench import component_module
+
+codec = component_module("MessageCodec")
+RobotMessages = codec.RobotMessages
+parse_coordinates = codec.parse_coordinates
+
+
+def test_shadow_update_is_the_full_message():
+    messages = RobotMessages("robot-1", "vacuum")
+    assert json.loads(messages.shadow_update({"working_status": "AutoClean", "fan_status": "Quiet"})) == {
+        "topic_name": "$aws/things/robot-1/shadow/update",
+        "opt": "send_to_device",
+        "sub_type": "vacuum",
+        "thing_name": "robot-1",
+        "topic_payload": {"state": {"working_status": "AutoClean", "fan_status": "Quiet"}},
+    }
+
+
+def test_values_with_quotes_are_escaped():
+    messages = RobotMessages('robot "1"', "vacuum")
+    state = {"nickname": 'Kitchen "bot" \\ upstairs', "goto_point": [1, 2]}
+    decoded = json.loads(messages.shadow_update(state))
+    assert decoded["thing_name"] == 'robot "1"'
+    assert decoded["topic_payload"]["state"] == state
+
+
+def test_prebuilt_requests():
+    messages = RobotMessages("robot-1", "vacuum")
+    assert json.loads(messages.status_get) == {"opt": "thing_status_get", "sub_type": "vacuum",
+                                               "thing_name": "robot-1"}
+    assert json.loads(messages.sync) == {"opt": "sync_thing", "sub_type": "vacuum", "thing_name": "robot-1"}
+
+
+@pytest.mark.parametrize("value, count, expected", [
+    ([1, 2], 2, [1, 2]),
+    ((1.5, -2), 2, [1.5, -2]),
+    ("[10, 20, 30, 40]", 4, [10, 20, 30, 40]),
+])
+def test_parse_coordinates(value, count, expected):
+    assert parse_coordinates(value, count) == expected
+
+
+@pytest.mark.parametrize("value, count", [
+    ([1, 2, 3], 2),
+    ([1], 2),
+    ([True, 2], 2),
+    ([float("nan"), 2], 2),
+    ([float("inf"), 2], 2),
+    (["1", 2], 2),
+    ("[1, NaN]", 2),
+    ("not json", 2),
+    ({"x": 1, "y": 2}, 2),
+    (None, 2),
+])
+def test_parse_coordinates_rejects(value, count):
+    with pytest.raises(ValueError):
+        parse_coordinates(value, count)
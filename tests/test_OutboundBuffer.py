@@ -0,0 +1,93 @@
+import asyncio
+
+from bench import component_module
+
+ConnectionMetrics = component_module("ConnectionMetrics").ConnectionMetrics
+outbound = component_module("OutboundBuffer")
+OutboundBuffer = outbound.OutboundBuffer
+PRIORITY_COMMAND = outbound.PRIORITY_COMMAND
+PRIORITY_STATUS = outbound.PRIORITY_STATUS
+
+
+def drain(buffer):
+    frames = []
+    entry = buffer.pop()
+    while entry is not None:
+        frames += entry.frames
+        entry = buffer.pop()
+    return frames
+
+
+def test_commands_go_before_status_then_by_age():
+    buffer = OutboundBuffer(ConnectionMetrics())
+    buffer.put(("status-1",), PRIORITY_STATUS)
+    buffer.put(("command-1",), PRIORITY_COMMAND)
+    buffer.put(("status-2",), PRIORITY_STATUS)
+    buffer.put(("command-2", "sync"), PRIORITY_COMMAND)
+    assert drain(buffer) == ["command-1", "command-2", "sync", "status-1", "status-2"]
+
+
+def test_expired_entries_are_never_sent():
+    metrics = ConnectionMetrics()
+    buffer = OutboundBuffer(metrics)
+    buffer.put(("late",), ttl=-1)
+    buffer.put(("fresh",), ttl=30)
+    assert drain(buffer) == ["fresh"]
+    assert metrics.counters["outbound_expired"] == 1
+
+
+def test_expire_drops_only_expired_entries():
+    metrics = ConnectionMetrics()
+    buffer = OutboundBuffer(metrics)
+    buffer.put(("late",), ttl=-1)
+    buffer.put(("fresh",), ttl=30)
+    buffer.expire()
+    assert len(buffer) == 1
+    assert metrics.counters["outbound_expired"] == 1
+
+
+def test_overflow_drops_the_oldest_status():
+    metrics = ConnectionMetrics()
+    buffer = OutboundBuffer(metrics, limit=2)
+    buffer.put(("status-1",), PRIORITY_STATUS)
+    buffer.put(("status-2",), PRIORITY_STATUS)
+    assert buffer.put(("command",), PRIORITY_COMMAND)
+    assert drain(buffer) == ["command", "status-2"]
+    assert metrics.counters["outbound_overflow"] == 1
+
+
+def test_overflow_refuses_status_when_full_of_commands():
+    buffer = OutboundBuffer(ConnectionMetrics(), limit=1)
+    buffer.put(("command",), PRIORITY_COMMAND)
+    assert not buffer.put(("status",), PRIORITY_STATUS)
+    assert drain(buffer) == ["command"]
+
+
+def test_requeue_keeps_the_entry_in_place():
+    buffer = OutboundBuffer(ConnectionMetrics())
+    buffer.put(("first",))
+    buffer.put(("second",))
+    buffer.requeue(buffer.pop())
+    assert drain(buffer) == ["first", "second"]
+
+
+def test_wait_returns_once_something_is_queued():
+    async def scenario():
+        buffer = OutboundBuffer(ConnectionMetrics())
+        waiter = asyncio.create_task(buffer.wait())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        buffer.put(("frame",))
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(scenario())
+
+
+def test_dropped_entries_report_why():
+    dropped = []
+    buffer = OutboundBuffer(ConnectionMetrics(), limit=1)
+    buffer.put(("command",), PRIORITY_COMMAND, on_dropped=dropped.append)
+    assert not buffer.put(("status",), PRIORITY_STATUS, on_dropped=dropped.append)
+    buffer.put(("newer command",), PRIORITY_COMMAND, ttl=-1, on_dropped=dropped.append)
+    assert drain(buffer) == []
+    assert [type(error) for error in dropped] == [outbound.FramesDropped] * 3
@@ -0,0 +1,221 @@
+import asyncio
+
+import pytest
+
+from bench import component_module
+
+CommandQueue = component_module("CommandQueue").CommandQueue
+FramesDropped = component_module("OutboundBuffer").FramesDropped
+RobotController = component_module("RobotController").RobotController
+
+
+class FakeApi:
+    """Records shadow updates, writing them to the socket only when told to."""
+
+    def __init__(self, written=True):
+        self.written = written
+        self.sent = []
+        self.pending = []
+        self.polls = 0
+
+    async def send_state(self, messages, state, sync=False, on_sent=None, on_dropped=None):
+        self.sent.append(dict(state))
+        if on_sent is not None:
+            if self.written:
+                on_sent()
+            else:
+                self.pending.append(on_sent)
+        return True
+
+    async def update_status(self, messages):
+        self.polls += 1
+
+    def register_update_callback(self, thing_name, callback):
+        pass
+
+
+def controller(api):
+    robot = RobotController("robot-1", "Robot", "vacuum", {"working_status": "Hibernating"}, api)
+    robot.commands = CommandQueue(robot.send_command, debounce=0.01, debounce_max=0.05, min_interval=0)
+    return robot
+
+
+def test_ack_resolved_by_matching_status():
+    async def scenario():
+        robot = controller(FakeApi())
+        command = asyncio.create_task(robot.send_state({"working_status": "AutoClean"}, wait=True, timeout=1))
+        await asyncio.sleep(0.05)
+        robot.status_received({"working_status": "AutoClean", "battery_level": 90})
+        assert await command >= 0
+        assert robot.acks == []
+        assert robot.last_command_latency is not None
+
+    asyncio.run(scenario())
+
+
+def test_ack_needs_the_key_in_the_update():
+    async def scenario():
+        robot = controller(FakeApi())
+        robot.status["working_status"] = "AutoClean"
+        command = asyncio.create_task(robot.send_state({"working_status": "AutoClean"}, wait=True, timeout=0.1))
+        await asyncio.sleep(0.05)
+        # The merged status already matches, but this update does not report working_status
+        robot.status_received({"battery_level": 80})
+        with pytest.raises(asyncio.TimeoutError):
+            await command
+        assert robot.acks == []
+
+    asyncio.run(scenario())
+
+
+def test_ack_clock_starts_when_frame_is_written():
+    async def scenario():
+        api = FakeApi(written=False)
+        robot = controller(api)
+        command = asyncio.create_task(robot.send_state({"working_status": "AutoClean"}, wait=True, timeout=1))
+        await asyncio.sleep(0.05)
+        # Status received while the frame is still buffered cannot confirm it
+        robot.status_received({"working_status": "AutoClean"})
+        assert not command.done()
+
+        api.pending.pop()()
+        robot.status_received({"working_status": "AutoClean"})
+        assert await command >= 0
+
+    asyncio.run(scenario())
+
+
+def test_superseded_writes_follow_the_last_value():
+    async def scenario():
+        api = FakeApi()
+        robot = controller(api)
+        first = asyncio.create_task(robot.send_message("working_status", "AutoClean", wait=True, timeout=1))
+        second = asyncio.create_task(robot.send_message("working_status", "Standby", wait=True, timeout=1))
+        await asyncio.sleep(0.1)
+        assert api.sent == [{"working_status": "Standby"}]
+
+        robot.status_received({"working_status": "Standby"})
+        await asyncio.gather(first, second)
+        assert robot.queued_acks == []
+
+    asyncio.run(scenario())
+
+
+def test_acks_stay_with_their_own_frame():
+    async def scenario():
+        api = FakeApi()
+        robot = controller(api)
+        fan = asyncio.create_task(robot.send_message("fan_status", "Strong", wait=True, timeout=0.2))
+        await asyncio.sleep(0.1)
+        mode = asyncio.create_task(robot.send_message("working_status", "AutoClean", wait=True, timeout=1))
+        await asyncio.sleep(0.1)
+        assert api.sent == [{"fan_status": "Strong"}, {"working_status": "AutoClean"}]
+
+        robot.status_received({"working_status": "AutoClean"})
+        assert await mode >= 0
+        with pytest.raises(asyncio.TimeoutError):
+            await fan
+
+    asyncio.run(scenario())
+
+
+def test_stop_cancels_waiting_commands():
+    async def scenario():
+        robot = controller(FakeApi())
+        command = asyncio.create_task(robot.send_state({"working_status": "AutoClean"}, wait=True, timeout=30))
+        await asyncio.sleep(0)
+        timer = robot.acks[0].timer
+        robot.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await command
+        assert timer.cancelled()
+        assert robot.acks == []
+
+    asyncio.run(scenario())
+
+
+class FullApi(FakeApi):
+    """An outbound buffer that refuses everything."""
+
+    async def send_state(self, messages, state, sync=False, on_sent=None, on_dropped=None):
+        self.sent.append(dict(state))
+        if on_dropped is not None:
+            on_dropped(FramesDropped("Outbound buffer full"))
+        return False
+
+
+def test_refused_command_fails_at_once():
+    async def scenario():
+        robot = controller(FullApi())
+        with pytest.raises(FramesDropped):
+            await asyncio.wait_for(robot.send_state({"working_status": "AutoClean"}, wait=True, timeout=30), 1)
+        with pytest.raises(FramesDropped):
+            await asyncio.wait_for(robot.send_message("working_status", "Standby", wait=True, timeout=30), 1)
+        assert robot.acks == [] and robot.queued_acks == []
+
+    asyncio.run(scenario())
+
+
+def test_multi_key_writes_share_the_queue():
+    async def scenario():
+        api = FakeApi()
+        robot = controller(api)
+        syncs = []
+        send_state = api.send_state
+
+        async def recording(messages, state, sync=False, on_sent=None, on_dropped=None):
+            syncs.append(sync)
+            return await send_state(messages, state, sync, on_sent, on_dropped)
+
+        api.send_state = recording
+        await robot.send_message("fan_status", "Quiet")
+        await robot.goto([10, 20])
+        await asyncio.sleep(0.1)
+        assert api.sent == [{"fan_status": "Quiet", "working_status": "PlanningLocation", "goto_point": [10, 20]}]
+        assert syncs == [True]
+
+    asyncio.run(scenario())
+
+
+def test_apply_status_merges_and_reports_changed_keys():
+    robot = controller(FakeApi())
+    robot.status = {"working_status": "Hibernating", "battery_level": 90}
+    assert robot.apply_status({"working_status": "AutoClean", "battery_level": 90, "fan_status": "Quiet"}) == {
+        "working_status", "fan_status"}
+    assert robot.status == {"working_status": "AutoClean", "battery_level": 90, "fan_status": "Quiet"}
+    assert robot.apply_status({"battery_level": 90}) == set()
+
+
+def test_update_callback_only_sees_changes():
+    robot = controller(FakeApi())
+    changes = []
+    robot.register_update_callback(changes.append)
+    robot.status_received({"working_status": "Hibernating", "battery_level": 90})
+    robot.status_received({"working_status": "Hibernating", "battery_level": 90})
+    robot.status_received({"working_status": "Hibernating", "battery_level": 89})
+    assert changes == [{"battery_level"}, {"battery_level"}]
+
+
+def test_concurrent_updates_share_one_request():
+    async def scenario():
+        api = FakeApi()
+        robot = controller(api)
+        updates = asyncio.gather(*(robot.update() for _ in range(5)))
+        await asyncio.sleep(0.01)
+        assert api.polls == 1
+        robot.status_received({"working_status": "AutoClean"})
+        await asyncio.wait_for(updates, 1)
+        assert robot.status_request is None
+
+    asyncio.run(scenario())
+
+
+def test_fresh_status_is_reused():
+    async def scenario():
+        api = FakeApi()
+        robot = controller(api)
+        robot.status_received({"working_status": "AutoClean"})
+        await asyncio.wait_for(robot.update(), 1)
+        assert api.polls == 0
+
+    asyncio.run(scenario())
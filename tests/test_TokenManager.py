@@ -0,0 +1,165 @@
+import asyncio
+import base64
+import json
+import time
+
+import pytest
+
+from bench import component_module
+
+tokens_module = component_module("TokenManager")
+TokenManager = tokens_module.TokenManager
+token_expiry = tokens_module.token_expiry
+
+
+def jwt(expires_at):
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": expires_at}).encode()).rstrip(b"=").decode()
+    return "header." + claims + ".signature"
+
+
+class Response:
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeClient:
+    """Answers logins after a short delay, counting them."""
+
+    def __init__(self, status_code=200, msg="success"):
+        self.status_code = status_code
+        self.msg = msg
+        self.logins = 0
+
+    async def post(self, url, json=None):
+        self.logins += 1
+        await asyncio.sleep(0.01)
+        return Response(self.status_code, {
+            "msg": self.msg,
+            "data": {
+                "jwt_token": jwt(time.time() + 3600),
+                "region_name": "eu",
+                "wss_url": "wss://example.invalid",
+                "api_url": "https://example.invalid/api",
+            },
+        })
+
+
+def manager(client):
+    return TokenManager("user@example.com", "secret", "54", lambda: client, "https://example.invalid/oauth")
+
+
+def test_concurrent_refreshes_share_one_login():
+    async def scenario():
+        client = FakeClient()
+        tokens = manager(client)
+        results = await asyncio.gather(*(tokens.refresh() for _ in range(10)))
+        assert results == [True] * 10
+        assert client.logins == 1
+        assert not tokens.expired
+
+    asyncio.run(scenario())
+
+
+def test_refresh_of_an_already_replaced_token_does_not_log_in():
+    async def scenario():
+        client = FakeClient()
+        tokens = manager(client)
+        await tokens.refresh()
+        rejected = "an older token"
+        assert await tokens.refresh(rejected)
+        assert client.logins == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_login_is_shared_and_retried_later():
+    async def scenario():
+        client = FakeClient(msg="fail")
+        tokens = manager(client)
+        results = await asyncio.gather(*(tokens.valid_token() for _ in range(5)))
+        assert results == [False] * 5
+        assert client.logins == 1
+        assert tokens.refresh_task is None
+
+        client.msg = "success"
+        assert await tokens.valid_token()
+        assert client.logins == 2
+
+    asyncio.run(scenario())
+
+
+def test_login_notifies_listeners():
+    async def scenario():
+        tokens = manager(FakeClient())
+        logins = []
+        remove = tokens.add_listener(lambda: logins.append(tokens.jwt_token))
+        await tokens.refresh()
+        remove()
+        await tokens.refresh(tokens.jwt_token)
+        assert len(logins) == 1
+
+    asyncio.run(scenario())
+
+
+def test_login_limit_is_shared_between_accounts():
+    class CountingClient(FakeClient):
+        running = 0
+        most = 0
+
+        async def post(self, url, json=None):
+            CountingClient.running += 1
+            CountingClient.most = max(CountingClient.most, CountingClient.running)
+            try:
+                return await super().post(url, json)
+            finally:
+                CountingClient.running -= 1
+
+    async def scenario():
+        limit = asyncio.Semaphore(2)
+        accounts = [manager(CountingClient()) for _ in range(5)]
+        for tokens in accounts:
+            tokens.login_limit = limit
+        assert all(await asyncio.gather(*(tokens.valid_token() for tokens in accounts)))
+        assert CountingClient.most == 2
+
+    asyncio.run(scenario())
+
+
+def test_token_expiry_reads_the_exp_claim():
+    assert token_expiry(jwt(1700000000)) == 1700000000
+
+
+@pytest.mark.parametrize("token", [None, "", "not-a-jwt", "header.%%%.signature", jwt("soon")])
+def test_unreadable_token_gets_the_default_lifetime(token):
+    before = time.time()
+    assert before + tokens_module.TOKEN_LIFETIME <= token_expiry(token) <= time.time() + tokens_module.TOKEN_LIFETIME
+
+
+def session(expires_at):
+    return {"jwt_token": jwt(expires_at), "region_name": "eu", "wss_url": "wss://example.invalid",
+            "api_url": "https://example.invalid/api", "expires_at": expires_at}
+
+
+def test_restored_session_skips_the_login():
+    async def scenario():
+        client = FakeClient()
+        tokens = manager(client)
+        cached = session(time.time() + 3600)
+        assert tokens.restore(cached)
+        assert await tokens.valid_token()
+        assert client.logins == 0
+        assert tokens.export() == cached
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("cached", [None, {}, session(time.time() + 60), session(time.time() - 3600)])
+def test_missing_or_expiring_session_is_not_restored(cached):
+    tokens = manager(FakeClient())
+    assert not tokens.restore(cached)
+    assert tokens.jwt_token is None
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+from bench import component_module
+
+traffic = component_module("TrafficRecorder")
+TrafficRecorder = traffic.TrafficRecorder
+read_trace = traffic.read_trace
+
+
+def test_recorded_frames_read_back(tmp_path):
+    path = tmp_path / "trace.jsonl"
+
+    async def scenario():
+        recorder = TrafficRecorder(str(path))
+        recorder.record(traffic.TRAFFIC_OUT, '{"opt":"thing_status_get"}')
+        recorder.record(traffic.TRAFFIC_IN, '{"notify_info":"thing_status_update"}')
+        await recorder.close()
+
+    asyncio.run(scenario())
+    records = read_trace(str(path))
+    assert [record[1:] for record in records] == [
+        ["out", '{"opt":"thing_status_get"}'],
+        ["in", '{"notify_info":"thing_status_update"}'],
+    ]
+    assert records[0][0] <= records[1][0]
+
+
+def test_rotate_keeps_the_newest_backups(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    recorder = TrafficRecorder(str(path), max_bytes=1, backups=2)
+    for n in range(4):
+        recorder.write([json.dumps([n, "in", "frame %d" % n])])
+
+    assert not path.exists()
+    assert read_trace(str(path) + ".1")[0][2] == "frame 3"
+    assert read_trace(str(path) + ".2")[0][2] == "frame 2"
+    assert not (tmp_path / "trace.jsonl.3").exists()
+
+
+def test_rotate_without_backups_starts_over(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    recorder = TrafficRecorder(str(path), max_bytes=1, backups=0)
+    recorder.write(['[0, "in", "frame"]'])
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("line", [
+    '{"at": 0}',
+    '[0, "in"]',
+    '[true, "in", "frame"]',
+    '["0", "in", "frame"]',
+    '[0, "sideways", "frame"]',
+    '[0, "in", {"notify_info": "x"}]',
+    'not json',
+])
+def test_read_trace_rejects_malformed_records(tmp_path, line):
+    path = tmp_path / "trace.jsonl"
+    path.write_text('[0, "in", "frame"]\n\n' + line + "\n")
+    with pytest.raises(ValueError, match="line 3"):
+        read_trace(str(path))
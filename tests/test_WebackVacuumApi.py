@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+import pytest
+
+from bench import component_module
+
+WebackVacuumApi = component_module("WebackVacuumApi").WebackVacuumApi
+
+AUTH_URL = "https://example.invalid/oauth"
+ROBOT = {"thing_name": "robot-1", "thing_nickname": "Robot", "sub_type": "vacuum", "thing_status": {}}
+ROBOTS = {"msg": "success", "data": {"thing_list": [ROBOT]}}
+
+
+@pytest.fixture
+def api():
+    return WebackVacuumApi("user@example.com", "secret", "54", None)
+
+
+@pytest.mark.parametrize("frame", [
+    "not json",
+    "[1, 2]",
+    "{}",
+    json.dumps({"notify_info": []}),
+    json.dumps({"notify_info": {"a": 1}}),
+    json.dumps({"notify_info": "thing_status_update", "thing_name": ["robot-1"], "thing_status": {}}),
+    json.dumps({"notify_info": "thing_status_update", "thing_name": "robot-1", "thing_status": "Charging"}),
+    json.dumps({"notify_info": "thing_status_update"}),
+])
+def test_malformed_frames_are_dropped(api, frame):
+    received = []
+    api.register_update_callback("robot-1", received.append)
+    api.handle_frame(frame)
+    assert api.dropped_frames == 1
+    assert received == []
+
+
+def test_status_update_reaches_its_robot(api):
+    received = []
+    api.register_update_callback("robot-1", received.append)
+    api.handle_frame(json.dumps({
+        "notify_info": "thing_status_update",
+        "thing_name": "robot-1",
+        "thing_status": {"working_status": "AutoClean"},
+    }))
+    assert received == [{"working_status": "AutoClean"}]
+    assert api.dropped_frames == 0
+
+
+def test_unknown_notify_info_is_counted(api):
+    api.handle_frame(json.dumps({"notify_info": "firmware_update"}))
+    api.handle_frame(json.dumps({"notify_info": "firmware_update"}))
+    assert api.unknown_notify_counts["firmware_update"] == 2
+    assert api.dropped_frames == 0
+
+
+def test_failing_handler_does_not_raise(api):
+    def handler(message):
+        raise KeyError("boom")
+
+    api.register_notify_handler("map_update", handler)
+    api.handle_frame(json.dumps({"notify_info": "map_update"}))
+
+
+class Response:
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class CloudClient:
+    """Answers logins with a fresh token and robot list requests from a script."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.logins = 0
+
+    async def post(self, url, json=None, headers=None):
+        if url == AUTH_URL:
+            self.logins += 1
+            return Response(200, {"msg": "success", "data": {
+                "jwt_token": "token-%d" % self.logins,
+                "region_name": "eu",
+                "wss_url": "wss://example.invalid",
+                "api_url": "https://example.invalid/api",
+            }})
+        return Response(*self.replies.pop(0))
+
+
+def cloud_api(client):
+    api = WebackVacuumApi("user@example.com", "secret", "54", None, http_client=client, auth_url=AUTH_URL)
+    api.tokens.restore({"jwt_token": "cached", "region_name": "eu", "wss_url": "wss://example.invalid",
+                        "api_url": "https://example.invalid/api", "expires_at": time.time() + 3600})
+    return api
+
+
+@pytest.mark.parametrize("refusal", [(401, {}), (200, {"msg": "fail"})])
+def test_refused_robot_list_refreshes_the_token_once(refusal):
+    client = CloudClient(refusal, (200, ROBOTS))
+    api = cloud_api(client)
+    assert asyncio.run(api.robot_list()) == [ROBOT]
+    assert client.logins == 1
+    assert api.tokens.jwt_token == "token-1"
+
+
+def test_robot_list_refused_after_refresh_is_false():
+    client = CloudClient((200, {"msg": "fail"}), (200, {"msg": "fail"}))
+    assert asyncio.run(cloud_api(client).robot_list()) is False
+    assert client.logins == 1
+
+
+def test_unreachable_cloud_does_not_log_in():
+    client = CloudClient((503, {}))
+    assert asyncio.run(cloud_api(client).robot_list()) is None
+    assert client.logins == 0
+
+
+@pytest.mark.parametrize("reply", [
+    [ROBOT],
+    {"msg": "success", "data": None},
+    {"msg": "success", "data": {"thing_list": None}},
+    {"msg": "success", "data": {"thing_list": [None]}},
+    {"msg": "success", "data": {"thing_list": [dict(ROBOT, thing_name=None)]}},
+    {"msg": "success", "data": {"thing_list": [{"thing_name": "robot-1", "thing_nickname": "Robot"}]}},
+])
+def test_malformed_robot_list_is_unreachable(reply):
+    client = CloudClient((200, reply))
+    assert asyncio.run(cloud_api(client).robot_list()) is None
+    assert client.logins == 0
+
+
+class FakeSocket:
+    """Stays open until closed, never sends anything."""
+
+    def __init__(self):
+        self.closed = asyncio.Event()
+        self.close_code = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.closed.wait()
+        raise StopAsyncIteration
+
+    async def close(self):
+        self.close_code = 1000
+        self.closed.set()
+
+
+class FakeSession:
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.connects = 0
+
+    async def ws_connect(self, url, **kwargs):
+        self.connects += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise aiohttp.ClientConnectionError("refused")
+        return FakeSocket()
+
+
+def test_concurrent_connects_share_one_handshake():
+    async def scenario():
+        session = FakeSession()
+        api = cloud_api(CloudClient())
+        api.session = session
+        waiter = asyncio.create_task(api.wait_until_ready(1))
+        assert await asyncio.gather(*(api.connect_wss() for _ in range(10))) == [True] * 10
+        assert session.connects == 1
+        assert await waiter
+        assert await api.connect_wss()
+        assert session.connects == 1
+        await api.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_failed_handshake_fails_every_caller_once():
+    async def scenario():
+        session = FakeSession(fail=True)
+        api = cloud_api(CloudClient())
+        api.session = session
+        assert await asyncio.gather(*(api.connect_wss() for _ in range(5))) == [False] * 5
+        assert session.connects == 1
+        assert api.connect_task is None
+
+    asyncio.run(scenario())